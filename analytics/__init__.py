@@ -1,10 +1,22 @@
 from .data_analytics import (
     get_expense_dataframe,
+    load_expense_dataframe,
     clean_expense_data,
+    ANALYTICS_COLUMNS,
     get_monthly_summary,
     get_category_distribution,
     get_daily_spending_trend,
     get_monthly_totals,
     get_spending_statistics,
+    get_window_stats,
+    get_range_summary,
     estimate_monthly_savings
 )
+from .context import analytics_context, get_active_context
+from .cache import analytics_cache, cached_analytics
+from .pushdown import grouped_expense_totals
+from .streaming import stream_window_stats
+from .range_index import get_range_index, range_index_cache
+from .spending_cube import get_spending_cube, advance_spending_cube, spending_cube_cache
+from .snapshots import get_snapshot, advance_snapshot, snapshot_cache
+from .batch import compute_batch_summaries, run_batch_summaries, get_batch_summary
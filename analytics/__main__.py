@@ -0,0 +1,37 @@
+"""
+Analytics batch commands
+
+Usage:
+    python -m analytics batch-summaries   Compute and store every user's summaries in one pass
+"""
+import sys
+import time
+from database.connection import init_database
+from analytics.batch import run_batch_summaries
+
+
+def batch_summaries():
+    init_database()
+    started = time.perf_counter()
+    written = run_batch_summaries()
+    if written is None:
+        print("Failed to store batch summaries.")
+        return 1
+    print(f"Summarized {written} users in {time.perf_counter() - started:.2f}s.")
+    return 0
+
+
+COMMANDS = {
+    'batch-summaries': batch_summaries,
+}
+
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in COMMANDS:
+        print(__doc__.strip())
+        return 2
+    return COMMANDS[argv[0]]()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,225 @@
+"""
+Cross-user batch analytics
+
+Every user's (user, day, category) totals and counts are read from the
+daily rollups over the longest window any summary needs, and the
+largest and smallest expenses are reduced chunk by chunk from one
+index-driven scan of the expenses in the statistics window. Every
+user's monthly summary, category distribution and spending statistics
+are then derived from that small table with vectorized groupbys,
+instead of one query and one DataFrame per user.
+
+Results have the same shape as get_monthly_summary,
+get_category_distribution and get_spending_statistics, and are stored in
+the user_analytics_summaries table for digests and admin reports.
+"""
+import json
+from datetime import datetime, timedelta
+import pandas as pd
+from config import Config
+from database.connection import execute_query, execute_many, iter_query_columns
+from expenses.expense_manager import to_start_day
+from analytics.data_analytics import summarize_month, summarize_distribution, summarize_statistics
+
+
+# Both scans go through users so every user's rows are read with a range
+# search on an index led by user_id; a bare date range would scan the table.
+# check_query_plans() verifies their plans.
+ROLLUP_SCAN_QUERY = """SELECT user_id, day AS date, category, total, count FROM expense_daily_rollups
+                       WHERE user_id IN (SELECT user_id FROM users) AND day >= %s AND day <= %s"""
+
+EXPENSE_SCAN_QUERY = """SELECT user_id, date, category, base_amount FROM expenses
+                        WHERE user_id IN (SELECT user_id FROM users) AND date >= %s AND date <= %s"""
+
+
+def scan_daily_aggregates(start_date, end_date, chunk_size=None, extremes_start=None):
+    """
+    Aggregate every user's spending per user, day and category
+
+    Totals and counts come from the daily rollups. The rollups do not
+    keep the largest and smallest expense, so those are reduced chunk by
+    chunk from one scan of the expenses from extremes_start on.
+
+    Args:
+        start_date: First day ('YYYY-MM-DD', inclusive)
+        end_date: Last day ('YYYY-MM-DD', inclusive)
+        chunk_size: Rows per batch (default: Config.ANALYTICS_CHUNK_SIZE)
+        extremes_start: First day max and min are needed for (default:
+                        start_date); earlier rows hold NaN
+
+    Returns:
+        DataFrame with user_id, date, category, total, count, max and min
+    """
+    keys = ['user_id', 'date', 'category']
+    columns = keys + ['total', 'count', 'max', 'min']
+
+    rollups = execute_query(ROLLUP_SCAN_QUERY, (start_date, end_date), fetch_columns=True)
+    if not rollups or not rollups['user_id']:
+        return pd.DataFrame(columns=columns)
+
+    partials = []
+    chunks = iter_query_columns(
+        EXPENSE_SCAN_QUERY,
+        (max(start_date, extremes_start or start_date), end_date),
+        chunk_size=chunk_size or Config.ANALYTICS_CHUNK_SIZE
+    )
+    for chunk in chunks:
+        df = pd.DataFrame(chunk)
+        df['category'] = df['category'].fillna('Other')
+        partials.append(df.groupby(keys, sort=False)['base_amount'].agg(['max', 'min']))
+
+    daily = pd.DataFrame(rollups)
+    if partials:
+        extremes = pd.concat(partials).groupby(level=keys).agg({'max': 'max', 'min': 'min'})
+        daily = daily.merge(extremes.reset_index(), on=keys, how='left')
+    else:
+        daily = daily.assign(max=float('nan'), min=float('nan'))
+    return daily.sort_values(keys, ignore_index=True)[columns]
+
+
+def _window_stats_by_user(daily, start_day, end_day):
+    """Per-user window statistics dicts (see compute_window_stats)"""
+    window = daily[(daily['date'] >= start_day) & (daily['date'] <= end_day)]
+    totals = window.groupby('user_id').agg(
+        total=('total', 'sum'), count=('count', 'sum'), max=('max', 'max'), min=('min', 'min')
+    )
+    by_category = window.groupby(['user_id', 'category'])['total'].sum()
+
+    categories = {}
+    for (user_id, category), total in zip(by_category.index.tolist(), by_category.tolist()):
+        categories.setdefault(user_id, {})[category] = total
+
+    return {
+        user_id: {
+            'total': total,
+            'count': count,
+            'mean': total / count,
+            'max': highest,
+            'min': lowest,
+            'categories': categories[user_id]
+        }
+        for user_id, total, count, highest, lowest in zip(
+            totals.index.tolist(), totals['total'].tolist(), totals['count'].tolist(),
+            totals['max'].tolist(), totals['min'].tolist()
+        )
+    }
+
+
+def _category_rows_by_user(daily, start_day, end_day):
+    """Per-user lists of {category, total, count} dicts, ordered by category"""
+    window = daily[(daily['date'] >= start_day) & (daily['date'] <= end_day)]
+    grouped = window.groupby(['user_id', 'category'])[['total', 'count']].sum()
+
+    rows = {}
+    for (user_id, category), total, count in zip(
+        grouped.index.tolist(), grouped['total'].tolist(), grouped['count'].tolist()
+    ):
+        rows.setdefault(user_id, []).append({'category': category, 'key': category, 'total': total, 'count': count})
+    return rows
+
+
+def compute_batch_summaries(end_date=None, months=3, chunk_size=None):
+    """
+    Compute every user's summaries from one scan of the expenses table
+
+    Args:
+        end_date: Reference date (default: now)
+        months: Months covered by the category distribution
+        chunk_size: Rows per scan batch
+
+    Returns:
+        Dict of user_id -> {period, monthly_summary, category_distribution,
+        spending_statistics}
+    """
+    end_date = end_date or datetime.now()
+    today = end_date.strftime('%Y-%m-%d')
+
+    month_start = datetime(end_date.year, end_date.month, 1)
+    next_month = datetime(end_date.year + end_date.month // 12, end_date.month % 12 + 1, 1)
+    month_end = next_month - timedelta(days=1)
+    distribution_start = to_start_day(end_date - timedelta(days=months * 30))
+    window_starts = {days: to_start_day(end_date - timedelta(days=days)) for days in (30, 90)}
+
+    scan_start = min([month_start.strftime('%Y-%m-%d'), distribution_start, *window_starts.values()])
+    scan_end = max(month_end.strftime('%Y-%m-%d'), today)
+    daily = scan_daily_aggregates(scan_start, scan_end, chunk_size, extremes_start=window_starts[90])
+
+    monthly = _category_rows_by_user(daily, month_start.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d'))
+    distribution = _category_rows_by_user(daily, distribution_start, today)
+    windows = {days: _window_stats_by_user(daily, start, today) for days, start in window_starts.items()}
+
+    users = execute_query("SELECT user_id FROM users ORDER BY user_id", fetch_columns=True) or {'user_id': []}
+    empty_window = {'total': 0.0, 'count': 0, 'mean': 0.0, 'max': 0.0, 'min': 0.0, 'categories': {}}
+
+    return {
+        user_id: {
+            'period': month_start.strftime('%Y-%m'),
+            'monthly_summary': summarize_month(monthly.get(user_id, []), month_end.day),
+            'category_distribution': summarize_distribution(distribution.get(user_id, [])),
+            'spending_statistics': summarize_statistics(
+                windows[30].get(user_id, empty_window), windows[90].get(user_id, empty_window)
+            )
+        }
+        for user_id in users['user_id']
+    }
+
+
+def store_batch_summaries(summaries):
+    """
+    Write batch summaries to user_analytics_summaries, replacing old rows
+
+    Args:
+        summaries: Dict returned by compute_batch_summaries
+
+    Returns:
+        Number of rows written, or None if the write failed
+    """
+    return execute_many(
+        """INSERT OR REPLACE INTO user_analytics_summaries
+           (user_id, period, monthly_summary, category_distribution, spending_statistics)
+           VALUES (%s, %s, %s, %s, %s)""",
+        [(user_id, s['period'], json.dumps(s['monthly_summary']),
+          json.dumps(s['category_distribution']), json.dumps(s['spending_statistics']))
+         for user_id, s in summaries.items()]
+    )
+
+
+def run_batch_summaries(end_date=None):
+    """
+    Compute and store every user's summaries
+
+    Returns:
+        Number of users summarized, or None if the write failed
+    """
+    summaries = compute_batch_summaries(end_date)
+    if not summaries:
+        return 0
+    return store_batch_summaries(summaries)
+
+
+def get_batch_summary(user_id):
+    """
+    Get a user's stored batch summary
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        Dict like compute_batch_summaries values plus computed_at, or None
+    """
+    row = execute_query(
+        """SELECT period, monthly_summary, category_distribution, spending_statistics, computed_at
+           FROM user_analytics_summaries WHERE user_id = %s""",
+        (user_id,),
+        fetch_one=True
+    )
+    if not row:
+        return None
+
+    return {
+        'period': row['period'],
+        'monthly_summary': json.loads(row['monthly_summary']),
+        'category_distribution': json.loads(row['category_distribution']),
+        'spending_statistics': json.loads(row['spending_statistics']),
+        'computed_at': row['computed_at']
+    }
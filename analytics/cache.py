@@ -0,0 +1,109 @@
+"""
+Versioned per-user cache for analytics results
+
+Results are keyed by (user_id, function, arguments, data version, day).
+The data version changes on every write to the user's expenses, so a
+cached value is never served after the data it was computed from has
+changed; the day is part of the key because the analytics windows trail
+the current date.
+"""
+import copy
+import inspect
+import threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from config import Config
+from expenses.expense_manager import get_user_data_version
+from analytics.context import get_active_context
+
+
+class AnalyticsCache:
+    """Thread-safe bounded LRU cache with hit/miss counters"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, value) on a hit, (False, None) on a miss"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+analytics_cache = AnalyticsCache(Config.ANALYTICS_CACHE_SIZE)
+
+
+def current_data_version(user_id):
+    """
+    Get the user's data version, looked up once per analytics context
+    """
+    context = get_active_context()
+    if context is not None and context.user_id == user_id:
+        if context.data_version is None:
+            context.data_version = get_user_data_version(user_id)
+        return context.data_version
+    return get_user_data_version(user_id)
+
+
+def cached_analytics(func):
+    """
+    Cache a per-user analytics function whose first argument is user_id
+
+    Callers receive deep copies, so mutating a result never corrupts the
+    cached value.
+    """
+    signature = inspect.signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not Config.ANALYTICS_CACHE_ENABLED:
+            return func(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(bound.arguments.items())
+        user_id = arguments[0][1]
+
+        key = (user_id, func.__qualname__, arguments[1:],
+               current_data_version(user_id), date.today().isoformat())
+
+        hit, value = analytics_cache.get(key)
+        if not hit:
+            value = func(*args, **kwargs)
+            analytics_cache.put(key, value)
+        return copy.deepcopy(value)
+
+    return wrapper
@@ -0,0 +1,91 @@
+"""
+Request-scoped analytics context
+
+Inside analytics_context(user_id), the first get_expense_dataframe call
+loads the user's expenses for the widest trailing window any page needs
+(Config.ANALYTICS_CONTEXT_DAYS); every later call within that window is
+served as a slice of the same DataFrame instead of querying SQLite again.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+from config import Config
+from expenses.expense_manager import to_start_day, to_end_day
+
+
+_local = threading.local()
+
+
+class AnalyticsContext:
+    """Holds one user's expense DataFrame for the duration of a request"""
+
+    def __init__(self, user_id, days):
+        self.user_id = user_id
+        self.end_date = datetime.now()
+        self.start_date = self.end_date - timedelta(days=days)
+        self.loads = 0
+        self.hits = 0
+        self.data_version = None  # Filled in lazily by analytics.cache
+        self._frame = None
+
+    def covers(self, user_id, start_date, end_date):
+        """Check whether a requested window lies inside the loaded one"""
+        if user_id != self.user_id or start_date is None or end_date is None:
+            return False
+        return (to_start_day(start_date) >= to_start_day(self.start_date) and
+                to_end_day(end_date) <= to_end_day(self.end_date))
+
+    def slice(self, loader, start_date, end_date, columns):
+        """
+        Return the rows between start_date and end_date (inclusive days)
+
+        Args:
+            loader: Function loading (user_id, start_date, end_date) from SQLite
+            start_date: Window start
+            end_date: Window end
+            columns: Columns requested by the caller
+
+        Returns:
+            New DataFrame, safe for the caller to modify
+        """
+        if self._frame is None:
+            self._frame = loader(self.user_id, self.start_date, self.end_date)
+            self.loads += 1
+        else:
+            self.hits += 1
+
+        df = self._frame
+        if df.empty:
+            return pd.DataFrame()
+
+        start = pd.Timestamp(to_start_day(start_date))
+        end = pd.Timestamp(to_end_day(end_date))
+        mask = (df['date'] >= start) & (df['date'] <= end)
+        if not mask.any():
+            return pd.DataFrame()
+        selected = [c for c in columns if c in df.columns]
+        return df.loc[mask, selected].reset_index(drop=True)
+
+
+def get_active_context():
+    """Return the analytics context open on this thread, if any"""
+    return getattr(_local, 'context', None)
+
+
+@contextmanager
+def analytics_context(user_id, days=None):
+    """
+    Share one expense DataFrame between all analytics calls in a block
+
+    Args:
+        user_id: User whose expenses are shared
+        days: Trailing window to load (default: Config.ANALYTICS_CONTEXT_DAYS)
+    """
+    previous = get_active_context()
+    context = AnalyticsContext(user_id, days or Config.ANALYTICS_CONTEXT_DAYS)
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = previous
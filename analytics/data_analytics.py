@@ -2,29 +2,104 @@
 Data Analytics module using Pandas
 """
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
-from expenses.expense_manager import get_user_expenses
-from currency.converter import convert_currency
+from database.connection import execute_query
+from expenses.expense_manager import get_user_expense_columns, get_user_expenses_summary, EXPENSE_CATEGORIES, to_start_day, to_end_day
+from currency.converter import convert_currency, get_fallback_rates
+from analytics.context import get_active_context
+from analytics.windows import compute_window_stats
+from analytics.cache import cached_analytics
+from analytics.pushdown import grouped_expense_totals
+from analytics.streaming import stream_window_stats
+from analytics.range_index import get_range_index
+from analytics.snapshots import load_snapshot_frame
+from config import Config
 
 
-def get_expense_dataframe(user_id, start_date=None, end_date=None):
+# Columns loaded into analytics DataFrames (created_at and user_id are never read)
+ANALYTICS_COLUMNS = (
+    'expense_id',
+    'amount',
+    'base_amount',
+    'currency',
+    'category',
+    'date',
+    'description'
+)
+
+UNUSED_ANALYTICS_COLUMNS = ('created_at', 'user_id')
+
+# Currency vocabulary for the categorical currency column
+KNOWN_CURRENCIES = tuple(get_fallback_rates())
+
+# NumPy dtypes for the numeric expense columns
+NUMERIC_COLUMN_DTYPES = {
+    'expense_id': np.int64,
+    'user_id': np.int64,
+    'amount': np.float64,
+    'base_amount': np.float64
+}
+
+
+def get_expense_dataframe(user_id, start_date=None, end_date=None, columns=ANALYTICS_COLUMNS):
     """
     Convert user expenses to a Pandas DataFrame
     
+    Inside an analytics_context the window is sliced from the shared
+    request DataFrame instead of being queried again.
+    
     Args:
         user_id: User's ID
         start_date: Optional start date filter
         end_date: Optional end date filter
+        columns: Expense columns to load (default: ANALYTICS_COLUMNS)
     
     Returns:
         Pandas DataFrame of expenses
     """
-    expenses = get_user_expenses(user_id, start_date, end_date)
+    context = get_active_context()
+    if context is not None and context.covers(user_id, start_date, end_date):
+        return context.slice(load_expense_dataframe, start_date, end_date, columns)
     
-    if not expenses:
+    return load_expense_dataframe(user_id, start_date, end_date, columns)
+
+
+def load_expense_dataframe(user_id, start_date=None, end_date=None, columns=ANALYTICS_COLUMNS):
+    """
+    Load user expenses from SQLite into a Pandas DataFrame
+    
+    Rows are fetched column by column, so no per-row dicts are built.
+    
+    Args:
+        user_id: User's ID
+        start_date: Optional start date filter
+        end_date: Optional end date filter
+        columns: Expense columns to load (default: ANALYTICS_COLUMNS)
+    
+    Returns:
+        Pandas DataFrame of expenses
+    """
+    if Config.ANALYTICS_SNAPSHOTS_ENABLED:
+        df = load_snapshot_frame(user_id, start_date, end_date, columns,
+                                 known={'category': EXPENSE_CATEGORIES, 'currency': KNOWN_CURRENCIES})
+        if df is not None:
+            return cast_amount_columns(df)
+    
+    data = get_user_expense_columns(user_id, start_date, end_date, columns=columns)
+    
+    if not data or not data[columns[0]]:
         return pd.DataFrame()
     
-    df = pd.DataFrame(expenses)
+    frame = {}
+    for name, values in data.items():
+        if name in NUMERIC_COLUMN_DTYPES:
+            frame[name] = np.asarray(values, dtype=NUMERIC_COLUMN_DTYPES[name])
+        elif name == 'date':
+            frame[name] = parse_date_column(values)
+        else:
+            frame[name] = values
+    df = pd.DataFrame(frame)
     
     # Clean and normalize data
     df = clean_expense_data(df)
@@ -32,6 +107,14 @@ def get_expense_dataframe(user_id, start_date=None, end_date=None):
     return df
 
 
+def parse_date_column(values):
+    """Vectorized parse of ISO date strings, falling back to inference"""
+    try:
+        return pd.to_datetime(values, format='%Y-%m-%d')
+    except (ValueError, TypeError):
+        return pd.to_datetime(values)
+
+
 def clean_expense_data(df):
     """
     Clean and normalize expense data
@@ -45,28 +128,53 @@ def clean_expense_data(df):
     if df.empty:
         return df
     
+    # Drop bookkeeping columns analytics never reads
+    df = df.drop(columns=[c for c in UNUSED_ANALYTICS_COLUMNS if c in df.columns])
+    
     # Ensure date column is datetime
     if 'date' in df.columns:
         df['date'] = pd.to_datetime(df['date'])
     
-    # Fill missing categories
+    # Fill missing categories; store as a compact categorical
     if 'category' in df.columns:
-        df['category'] = df['category'].fillna('Other')
+        df['category'] = to_categorical(df['category'].fillna('Other'), EXPENSE_CATEGORIES)
+    
+    if 'currency' in df.columns:
+        df['currency'] = to_categorical(df['currency'].fillna(Config.DEFAULT_CURRENCY), KNOWN_CURRENCIES)
     
     # Fill missing descriptions
     if 'description' in df.columns:
         df['description'] = df['description'].fillna('')
     
     # Ensure numeric columns are proper type
-    if 'amount' in df.columns:
-        df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
-    
-    if 'base_amount' in df.columns:
-        df['base_amount'] = pd.to_numeric(df['base_amount'], errors='coerce').fillna(0)
+    for column in ('amount', 'base_amount'):
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').fillna(0)
     
+    return cast_amount_columns(df)
+
+
+def cast_amount_columns(df):
+    """Cast amount columns to Config.ANALYTICS_FLOAT_DTYPE (no copy if already)"""
+    float_dtype = np.dtype(Config.ANALYTICS_FLOAT_DTYPE)
+    for column in ('amount', 'base_amount'):
+        if column in df.columns and df[column].dtype != float_dtype:
+            df[column] = df[column].astype(float_dtype)
     return df
 
 
+def to_categorical(values, known):
+    """
+    Convert labels to a Categorical over a fixed vocabulary
+    
+    Labels outside the vocabulary are appended rather than lost.
+    Group with observed=True to skip categories with no rows.
+    """
+    extra = sorted(set(values.unique()) - set(known))
+    return pd.Categorical(values, categories=list(known) + extra)
+
+
+@cached_analytics
 def get_monthly_summary(user_id, year=None, month=None):
     """
     Get monthly spending summary
@@ -90,9 +198,29 @@ def get_monthly_summary(user_id, year=None, month=None):
     else:
         end_date = datetime(year, month + 1, 1) - timedelta(days=1)
     
-    df = get_expense_dataframe(user_id, start_date, end_date)
+    # Category breakdown from the monthly rollup
+    rows = execute_query(
+        """SELECT category, total, count FROM expense_monthly_rollups
+           WHERE user_id = %s AND month = %s""",
+        (user_id, start_date.strftime('%Y-%m')),
+        fetch=True
+    )
     
-    if df.empty:
+    return summarize_month(rows, (end_date - start_date).days + 1)
+
+
+def summarize_month(rows, days_in_month):
+    """
+    Build a monthly summary from per-category totals
+    
+    Args:
+        rows: Dicts with category, total and count
+        days_in_month: Number of days in the month
+    
+    Returns:
+        Dict with monthly statistics
+    """
+    if not rows:
         return {
             'total': 0,
             'count': 0,
@@ -101,15 +229,13 @@ def get_monthly_summary(user_id, year=None, month=None):
             'daily_avg': 0
         }
     
-    total = df['base_amount'].sum()
-    count = len(df)
-    average = df['base_amount'].mean()
+    total = sum(row['total'] for row in rows)
+    count = sum(row['count'] for row in rows)
+    average = total / count
     
-    # Category breakdown
-    categories = df.groupby('category')['base_amount'].sum().to_dict()
+    categories = {row['category']: row['total'] for row in rows}
     
     # Daily average
-    days_in_month = (end_date - start_date).days + 1
     daily_avg = total / days_in_month
     
     return {
@@ -121,6 +247,7 @@ def get_monthly_summary(user_id, year=None, month=None):
     }
 
 
+@cached_analytics
 def get_category_distribution(user_id, months=3):
     """
     Get category-wise spending distribution
@@ -135,20 +262,33 @@ def get_category_distribution(user_id, months=3):
     end_date = datetime.now()
     start_date = end_date - timedelta(days=months * 30)
     
-    df = get_expense_dataframe(user_id, start_date, end_date)
+    category_totals = grouped_expense_totals(user_id, start_date, end_date, group_by='category')
     
-    if df.empty:
+    return summarize_distribution(category_totals)
+
+
+def summarize_distribution(category_totals):
+    """
+    Convert per-category totals to percentages
+    
+    Args:
+        category_totals: Dicts with key (category) and total
+    
+    Returns:
+        Dict with category percentages
+    """
+    if not category_totals:
         return {}
     
-    total = df['base_amount'].sum()
-    category_totals = df.groupby('category')['base_amount'].sum()
+    total = sum(row['total'] for row in category_totals)
     
     return {
-        cat: round((amount / total) * 100, 1) 
-        for cat, amount in category_totals.items()
+        row['key']: round((row['total'] / total) * 100, 1) 
+        for row in category_totals
     }
 
 
+@cached_analytics
 def get_daily_spending_trend(user_id, days=30):
     """
     Get daily spending trend
@@ -163,16 +303,12 @@ def get_daily_spending_trend(user_id, days=30):
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
     
-    df = get_expense_dataframe(user_id, start_date, end_date)
+    daily = grouped_expense_totals(user_id, start_date, end_date, group_by='day')
     
-    if df.empty:
-        return {}
-    
-    daily = df.groupby(df['date'].dt.date)['base_amount'].sum()
-    
-    return {str(date): round(amount, 2) for date, amount in daily.items()}
+    return {row['key']: round(row['total'], 2) for row in daily}
 
 
+@cached_analytics
 def get_monthly_totals(user_id, months=6):
     """
     Get monthly spending totals
@@ -187,17 +323,78 @@ def get_monthly_totals(user_id, months=6):
     end_date = datetime.now()
     start_date = end_date - timedelta(days=months * 30)
     
+    # Grouping daily rollups keeps the partial first month exact
+    monthly = grouped_expense_totals(user_id, start_date, end_date, group_by='month')
+    
+    return {row['key']: round(row['total'], 2) for row in monthly}
+
+
+def get_window_stats(user_id, windows, end_date=None):
+    """
+    Get statistics for several trailing windows
+    
+    Histories larger than Config.ANALYTICS_STREAMING_THRESHOLD rows are
+    aggregated chunk by chunk; smaller ones are loaded into one DataFrame.
+    
+    Args:
+        user_id: User's ID
+        windows: Iterable of window lengths in days
+        end_date: Window end (default: now)
+    
+    Returns:
+        Dict of window length -> statistics dict
+    """
+    windows = list(windows)
+    end_date = end_date or datetime.now()
+    start_date = end_date - timedelta(days=max(windows))
+    
+    context = get_active_context()
+    in_context = context is not None and context.covers(user_id, start_date, end_date)
+    
+    if not in_context:
+        size = get_user_expenses_summary(user_id, start_date, end_date)['count']
+        if size > Config.ANALYTICS_STREAMING_THRESHOLD:
+            return stream_window_stats(user_id, windows, end_date)
+    
     df = get_expense_dataframe(user_id, start_date, end_date)
+    return compute_window_stats(df, windows, end_date)
+
+
+def get_range_summary(user_id, start_date=None, end_date=None):
+    """
+    Get spending totals for an arbitrary date range
     
-    if df.empty:
-        return {}
+    Answered from the user's prefix-sum range index with two lookups,
+    whatever the length of the range.
     
-    df['month'] = df['date'].dt.to_period('M')
-    monthly = df.groupby('month')['base_amount'].sum()
+    Args:
+        user_id: User's ID
+        start_date: Optional start date (inclusive)
+        end_date: Optional end date (inclusive)
     
-    return {str(month): round(amount, 2) for month, amount in monthly.items()}
+    Returns:
+        Dict with range statistics and category totals
+    """
+    index = get_range_index(user_id)
+    summary = index.summarize(to_start_day(start_date), to_end_day(end_date)) if index else None
+    
+    if not summary or summary['count'] == 0:
+        return {
+            'total': 0,
+            'count': 0,
+            'average': 0,
+            'categories': {}
+        }
+    
+    return {
+        'total': round(summary['total'], 2),
+        'count': summary['count'],
+        'average': round(summary['total'] / summary['count'], 2),
+        'categories': {k: round(v['total'], 2) for k, v in summary['categories'].items()}
+    }
 
 
+@cached_analytics
 def get_spending_statistics(user_id):
     """
     Get comprehensive spending statistics
@@ -208,14 +405,24 @@ def get_spending_statistics(user_id):
     Returns:
         Dict with various statistics
     """
-    # Last 30 days
+    # Last 30 and 90 days from a single pass
     end_date = datetime.now()
-    start_date_30 = end_date - timedelta(days=30)
-    start_date_90 = end_date - timedelta(days=90)
+    windows = get_window_stats(user_id, [30, 90], end_date)
+    
+    return summarize_statistics(windows[30], windows[90])
+
+
+def summarize_statistics(last_30, last_90):
+    """
+    Build spending statistics from 30- and 90-day window statistics
     
-    df_30 = get_expense_dataframe(user_id, start_date_30, end_date)
-    df_90 = get_expense_dataframe(user_id, start_date_90, end_date)
+    Args:
+        last_30: Window statistics dict (see compute_window_stats)
+        last_90: Window statistics dict
     
+    Returns:
+        Dict with various statistics
+    """
     stats = {
         'total_30_days': 0,
         'total_90_days': 0,
@@ -227,25 +434,26 @@ def get_spending_statistics(user_id):
         'lowest_expense': 0
     }
     
-    if not df_30.empty:
-        stats['total_30_days'] = round(df_30['base_amount'].sum(), 2)
-        stats['expense_count_30_days'] = len(df_30)
-        stats['average_expense'] = round(df_30['base_amount'].mean(), 2)
-        stats['highest_expense'] = round(df_30['base_amount'].max(), 2)
-        stats['lowest_expense'] = round(df_30['base_amount'].min(), 2)
+    if last_30['count']:
+        stats['total_30_days'] = round(last_30['total'], 2)
+        stats['expense_count_30_days'] = last_30['count']
+        stats['average_expense'] = round(last_30['mean'], 2)
+        stats['highest_expense'] = round(last_30['max'], 2)
+        stats['lowest_expense'] = round(last_30['min'], 2)
         
         # Category analysis
-        category_totals = df_30.groupby('category')['base_amount'].sum()
-        if not category_totals.empty:
-            stats['highest_category'] = category_totals.idxmax()
-            stats['lowest_category'] = category_totals.idxmin()
+        category_totals = last_30['categories']
+        if category_totals:
+            stats['highest_category'] = max(category_totals, key=category_totals.get)
+            stats['lowest_category'] = min(category_totals, key=category_totals.get)
     
-    if not df_90.empty:
-        stats['total_90_days'] = round(df_90['base_amount'].sum(), 2)
+    if last_90['count']:
+        stats['total_90_days'] = round(last_90['total'], 2)
     
     return stats
 
 
+@cached_analytics
 def estimate_monthly_savings(user_id, monthly_income=50000):
     """
     Estimate monthly savings based on spending patterns
@@ -0,0 +1,50 @@
+"""
+SQL pushdown for simple grouped aggregates
+
+Sums and counts grouped by category, month or day are computed inside
+SQLite over the trigger-maintained daily rollups, so only one row per
+group crosses into Python instead of every expense.
+"""
+from database.connection import execute_query
+from expenses.expense_manager import to_start_day, to_end_day
+
+
+# Group key -> SQL expression over expense_daily_rollups
+GROUP_KEYS = {
+    'category': 'category',
+    'month': 'substr(day, 1, 7)',
+    'day': 'day',
+}
+
+
+def grouped_expense_totals(user_id, start_date=None, end_date=None, group_by='category'):
+    """
+    Sum a user's expenses per group inside SQLite
+
+    Args:
+        user_id: User's ID
+        start_date: Optional start date (inclusive day)
+        end_date: Optional end date (inclusive day)
+        group_by: 'category', 'month' or 'day'
+
+    Returns:
+        List of dicts with key, total and count, ordered by key
+    """
+    if group_by not in GROUP_KEYS:
+        raise ValueError(f"Unknown group: {group_by}")
+
+    query = f"""SELECT {GROUP_KEYS[group_by]} AS key, SUM(total) AS total, SUM(count) AS count
+                FROM expense_daily_rollups WHERE user_id = %s"""
+    params = [user_id]
+
+    if start_date:
+        query += " AND day >= %s"
+        params.append(to_start_day(start_date))
+
+    if end_date:
+        query += " AND day <= %s"
+        params.append(to_end_day(end_date))
+
+    query += " GROUP BY key ORDER BY key"
+
+    return execute_query(query, tuple(params), fetch=True) or []
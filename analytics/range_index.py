@@ -0,0 +1,209 @@
+"""
+Prefix-sum index for arbitrary date-range totals
+
+Each user's daily rollups are turned into cumulative sums and counts per
+category over the sorted days that have expenses. The total and category
+breakdown of any [start, end] range is then the difference of two rows
+found by binary search, however long the range.
+
+Indexes are cached per process. When the user's data version moves on,
+only the expense_daily_deltas entries logged since the index was built
+are replayed: new days are inserted and the cumulative rows from each
+changed day onward are shifted, without rereading rollups or expenses.
+"""
+import numpy as np
+from config import Config
+from database.connection import execute_query
+from analytics.cache import AnalyticsCache, current_data_version
+
+
+range_index_cache = AnalyticsCache(Config.RANGE_INDEX_CACHE_SIZE)
+
+
+def _as_days(values):
+    """Convert 'YYYY-MM-DD...' strings to datetime64[D]"""
+    return np.array([str(value)[:10] for value in values], dtype='datetime64[D]')
+
+
+def _daily_matrices(rows, days, categories):
+    """Scatter (day, category, total, count) rows into per-day matrices"""
+    sums = np.zeros((len(days), len(categories)))
+    counts = np.zeros((len(days), len(categories)), dtype=np.int64)
+    if rows:
+        column = {category: i for i, category in enumerate(categories)}
+        day_positions = np.searchsorted(days, _as_days(row['day'] for row in rows))
+        category_positions = np.array([column[row['category']] for row in rows])
+        np.add.at(sums, (day_positions, category_positions), [row['total'] for row in rows])
+        np.add.at(counts, (day_positions, category_positions), [row['count'] for row in rows])
+    return sums, counts
+
+
+class RangeIndex:
+    """Cumulative daily sums and counts per category for one user"""
+
+    def __init__(self, days, categories, sums, counts, seq, version):
+        self.days = days                # Sorted datetime64[D], one entry per day with expenses
+        self.categories = categories    # Column labels of sums and counts
+        self.sums = sums                # Row i holds totals of every day before days[i]
+        self.counts = counts
+        self.seq = seq                  # Last delta log entry reflected in the index
+        self.version = version          # User data version at that point
+
+    @classmethod
+    def build(cls, rows, seq, version):
+        """
+        Build an index from daily rollup rows
+
+        Args:
+            rows: Dicts with day, category, total and count
+            seq: Last delta log entry the rows include
+            version: User data version the rows correspond to
+        """
+        days = np.unique(_as_days(row['day'] for row in rows))
+        categories = sorted({row['category'] for row in rows})
+        sums, counts = _daily_matrices(rows, days, categories)
+
+        zeros = np.zeros((1, len(categories)))
+        return cls(
+            days, categories,
+            np.vstack([zeros, np.cumsum(sums, axis=0)]),
+            np.vstack([zeros.astype(np.int64), np.cumsum(counts, axis=0)]),
+            seq, version
+        )
+
+    def apply(self, deltas, seq, version):
+        """
+        Return a new index with signed daily deltas applied
+
+        Args:
+            deltas: Dicts with day, category, total and count
+            seq: Last delta log entry included in deltas
+            version: User data version after the deltas
+        """
+        if not deltas:
+            return RangeIndex(self.days, self.categories, self.sums, self.counts, seq, version)
+
+        new_categories = sorted({row['category'] for row in deltas} - set(self.categories))
+        categories = self.categories + new_categories
+
+        # New categories start with all-zero cumulative columns (np.pad copies)
+        sums = np.pad(self.sums, ((0, 0), (0, len(new_categories))))
+        counts = np.pad(self.counts, ((0, 0), (0, len(new_categories))))
+
+        days = self.days
+        new_days = np.setdiff1d(_as_days(row['day'] for row in deltas), days)
+        if len(new_days):
+            # A day inserted before days[p] starts out repeating cumulative row p
+            positions = np.searchsorted(days, new_days)
+            days = np.insert(days, positions, new_days)
+            sums = np.insert(sums, positions + 1, sums[positions], axis=0)
+            counts = np.insert(counts, positions + 1, counts[positions], axis=0)
+
+        daily_sums, daily_counts = _daily_matrices(deltas, days, categories)
+        sums[1:] += np.cumsum(daily_sums, axis=0)
+        counts[1:] += np.cumsum(daily_counts, axis=0)
+
+        return RangeIndex(days, categories, sums, counts, seq, version)
+
+    def summarize(self, start_date=None, end_date=None):
+        """
+        Total a date range with two lookups
+
+        Args:
+            start_date: Optional 'YYYY-MM-DD' start (inclusive)
+            end_date: Optional 'YYYY-MM-DD' end (inclusive)
+
+        Returns:
+            Dict with total, count and per-category totals and counts
+        """
+        lo = 0
+        hi = len(self.days)
+        if start_date is not None:
+            lo = int(np.searchsorted(self.days, np.datetime64(start_date, 'D'), side='left'))
+        if end_date is not None:
+            hi = int(np.searchsorted(self.days, np.datetime64(end_date, 'D'), side='right'))
+        hi = max(hi, lo)
+
+        sums = self.sums[hi] - self.sums[lo]
+        counts = self.counts[hi] - self.counts[lo]
+
+        return {
+            'total': float(sums.sum()),
+            'count': int(counts.sum()),
+            'categories': {
+                category: {'total': float(total), 'count': int(count)}
+                for category, total, count in zip(self.categories, sums, counts) if count > 0
+            }
+        }
+
+
+def load_range_index(user_id):
+    """
+    Build a user's index from the daily rollups
+
+    The delta log position and data version are read in the same
+    statement as the rollups, so they describe the same snapshot.
+    """
+    rows = execute_query(
+        """SELECT NULL AS day, NULL AS category, 0 AS total, 0 AS count,
+                  (SELECT COALESCE(MAX(seq), 0) FROM expense_daily_deltas) AS seq,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version
+           UNION ALL
+           SELECT day, category, total, count, NULL, NULL
+           FROM expense_daily_rollups WHERE user_id = %s""",
+        (user_id, user_id),
+        fetch=True
+    )
+    if rows is None:
+        return None
+
+    header = next(row for row in rows if row['day'] is None)
+    return RangeIndex.build([row for row in rows if row['day'] is not None],
+                            header['seq'], header['version'])
+
+
+def refresh_range_index(user_id, index):
+    """
+    Bring an index up to date by replaying the delta log
+
+    Falls back to a full rebuild when entries the index has not seen were
+    pruned from the log.
+    """
+    rows = execute_query(
+        """SELECT w.pruned_through,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version,
+                  d.seq, d.day, d.category, d.total, d.count
+           FROM expense_delta_watermark w
+           LEFT JOIN expense_daily_deltas d ON d.user_id = %s AND d.seq > %s
+           ORDER BY d.seq""",
+        (user_id, user_id, index.seq),
+        fetch=True
+    )
+    if not rows or rows[0]['pruned_through'] > index.seq:
+        return load_range_index(user_id)
+
+    deltas = [row for row in rows if row['seq'] is not None]
+    seq = deltas[-1]['seq'] if deltas else index.seq
+    return index.apply(deltas, seq, rows[0]['version'])
+
+
+def get_range_index(user_id):
+    """
+    Get a user's up-to-date range index
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        RangeIndex, or None if the database is unavailable
+    """
+    version = current_data_version(user_id)
+    hit, index = range_index_cache.get(user_id)
+
+    if hit and index.version >= version:
+        return index
+
+    index = refresh_range_index(user_id, index) if hit else load_range_index(user_id)
+    if index is not None:
+        range_index_cache.put(user_id, index)
+    return index
@@ -0,0 +1,437 @@
+"""
+Columnar per-user expense snapshots
+
+With Config.ANALYTICS_SNAPSHOTS_ENABLED, each user's expenses are kept in
+one columnar file under Config.ANALYTICS_SNAPSHOT_DIR, newest first like
+the SQLite loader. Files are memory-mapped, so a date range becomes a
+DataFrame from array views instead of a conversion of every row.
+
+Two formats are supported: an Arrow IPC file when pyarrow is installed,
+otherwise raw NumPy column buffers behind a JSON header. Either way
+categories and currencies are stored as int16 codes into a vocabulary.
+
+A snapshot records the data version and the expense_daily_deltas
+position it reflects. After the user's expenses change, the forecast
+precompute job (see predictions.precompute) re-reads only the expenses
+logged since then and merges them in before rewriting the file. Reads
+never write: until the file catches up they fall back to SQLite.
+"""
+import json
+import mmap
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from config import Config
+from database.connection import execute_query
+from expenses.expense_manager import get_user_expense_columns, to_start_day, to_end_day
+from analytics.cache import AnalyticsCache, current_data_version
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+
+# Columns held in a snapshot, in SQLite loader order
+SNAPSHOT_COLUMNS = ('expense_id', 'amount', 'base_amount', 'currency', 'category', 'date', 'description')
+
+CODED_COLUMNS = ('currency', 'category')
+
+NUMPY_MAGIC = b'FTSNAP01'
+NUMPY_ALIGNMENT = 64
+
+# Expense ids per IN (...) lookup when merging changes
+MERGE_BATCH_SIZE = 500
+
+snapshot_cache = AnalyticsCache(Config.ANALYTICS_SNAPSHOT_CACHE_SIZE)
+
+
+def snapshot_format():
+    """Return 'arrow' or 'numpy' according to configuration and pyarrow"""
+    if Config.ANALYTICS_SNAPSHOT_FORMAT == 'auto':
+        return 'arrow' if pa is not None else 'numpy'
+    return Config.ANALYTICS_SNAPSHOT_FORMAT
+
+
+def snapshot_path(user_id, fmt=None):
+    fmt = fmt or snapshot_format()
+    extension = 'arrow' if fmt == 'arrow' else 'snap'
+    return os.path.join(Config.ANALYTICS_SNAPSHOT_DIR, f'user_{user_id}.{extension}')
+
+
+# ==================== Column tables ====================
+
+def _table_from_columns(data):
+    """Normalize SQLite column lists to arrays, as clean_expense_data would"""
+    return {
+        'expense_id': np.asarray(data['expense_id'], dtype=np.int64),
+        'amount': pd.to_numeric(pd.Series(data['amount'], dtype=object), errors='coerce').fillna(0).to_numpy(np.float64),
+        'base_amount': pd.to_numeric(pd.Series(data['base_amount'], dtype=object), errors='coerce').fillna(0).to_numpy(np.float64),
+        'currency': np.array([c or Config.DEFAULT_CURRENCY for c in data['currency']], dtype=object),
+        'category': np.array([c or 'Other' for c in data['category']], dtype=object),
+        'date': pd.to_datetime(pd.Series(data['date'], dtype=object)).to_numpy(),
+        'description': np.array([d or '' for d in data['description']], dtype=object),
+    }
+
+
+def _sort_newest_first(table):
+    """Order rows by date, then expense_id, both descending"""
+    order = np.lexsort((table['expense_id'], table['date']))[::-1]
+    return {name: values[order] for name, values in table.items()}
+
+
+# ==================== File formats ====================
+
+def _encode_codes(labels):
+    vocabulary, codes = np.unique(labels.astype(str), return_inverse=True)
+    return vocabulary.tolist(), codes.astype(np.int16)
+
+
+def _write_numpy(path, table, meta):
+    """Write column buffers after a JSON header, each 64-byte aligned"""
+    buffers = {name: table[name] for name in ('expense_id', 'amount', 'base_amount', 'date')}
+    meta = dict(meta, vocabulary={})
+    for name in CODED_COLUMNS:
+        meta['vocabulary'][name], buffers[name] = _encode_codes(table[name])
+
+    encoded = [text.encode('utf-8') for text in table['description']]
+    buffers['description_offsets'] = np.concatenate(([0], np.cumsum([len(b) for b in encoded]))).astype(np.int64)
+    buffers['description_data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    # Lay out buffers back to back after the header, each padded to the alignment
+    columns, offset = {}, 0
+    for name, values in buffers.items():
+        columns[name] = {'dtype': values.dtype.str, 'count': len(values), 'offset': offset}
+        offset += -(-values.nbytes // NUMPY_ALIGNMENT) * NUMPY_ALIGNMENT
+    meta['columns'] = columns
+    header = json.dumps(meta).encode('utf-8')
+    data_start = -(-(len(NUMPY_MAGIC) + 8 + len(header)) // NUMPY_ALIGNMENT) * NUMPY_ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(NUMPY_MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, values in buffers.items():
+            f.seek(data_start + columns[name]['offset'])
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate(data_start + offset)
+
+
+def _read_numpy(path):
+    with open(path, 'rb') as f:
+        if f.read(len(NUMPY_MAGIC)) != NUMPY_MAGIC:
+            raise ValueError(f"Not a snapshot file: {path}")
+        header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        meta = json.loads(f.read(header_length))
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    data_start = -(-(len(NUMPY_MAGIC) + 8 + header_length) // NUMPY_ALIGNMENT) * NUMPY_ALIGNMENT
+    arrays = {}
+    for name, column in meta['columns'].items():
+        dtype = np.dtype(column['dtype'])
+        if column['count']:
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=column['count'],
+                                         offset=data_start + column['offset'])
+        else:
+            arrays[name] = np.empty(0, dtype=dtype)
+
+    offsets, data = arrays.pop('description_offsets'), arrays.pop('description_data')
+
+    def descriptions(lo, hi):
+        blob = data[offsets[lo]:offsets[hi]].tobytes()
+        base = offsets[lo]
+        return np.array([blob[a - base:b - base].decode('utf-8')
+                         for a, b in zip(offsets[lo:hi].tolist(), offsets[lo + 1:hi + 1].tolist())], dtype=object)
+
+    return arrays, descriptions, meta
+
+
+def _write_arrow(path, table, meta):
+    meta = dict(meta, vocabulary={})
+    columns = {name: table[name] for name in ('expense_id', 'amount', 'base_amount', 'date')}
+    for name in CODED_COLUMNS:
+        meta['vocabulary'][name], columns[name] = _encode_codes(table[name])
+    columns['description'] = pa.array(table['description'].tolist(), type=pa.string())
+
+    arrow_table = pa.table(columns).replace_schema_metadata({'snapshot': json.dumps(meta)})
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+
+
+def _read_arrow(path):
+    arrow_table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    meta = json.loads(arrow_table.schema.metadata[b'snapshot'])
+
+    # Single-chunk numeric columns convert to views of the mapped file
+    arrays = {}
+    for name in ('expense_id', 'amount', 'base_amount', 'date', *CODED_COLUMNS):
+        column = arrow_table.column(name)
+        column = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+        arrays[name] = column.to_numpy(zero_copy_only=False)
+    description = arrow_table.column('description')
+
+    def descriptions(lo, hi):
+        return description.slice(lo, hi - lo).to_numpy(zero_copy_only=False)
+
+    return arrays, descriptions, meta
+
+
+FORMATS = {
+    'arrow': (_write_arrow, _read_arrow),
+    'numpy': (_write_numpy, _read_numpy),
+}
+
+
+# ==================== Snapshots ====================
+
+class ExpenseSnapshot:
+    """One user's memory-mapped expense columns, newest first"""
+
+    def __init__(self, arrays, descriptions, meta):
+        self.arrays = arrays
+        self.descriptions = descriptions
+        self.vocabulary = meta['vocabulary']
+        self.seq = meta['seq']
+        self.version = meta['version']
+        self.rows = len(arrays['expense_id'])
+
+    def locate(self, start_date=None, end_date=None):
+        """Row range [lo, hi) of expenses dated within the inclusive days"""
+        ascending = self.arrays['date'][::-1]
+        first, last = 0, self.rows
+        if start_date is not None:
+            last = self.rows - int(np.searchsorted(ascending, np.datetime64(to_start_day(start_date)), side='left'))
+        if end_date is not None:
+            first = self.rows - int(np.searchsorted(ascending, np.datetime64(to_end_day(end_date)), side='right'))
+        return first, max(first, last)
+
+    def categorical(self, name, lo, hi, known):
+        """
+        Build a Categorical over known labels plus any extras present, in
+        the same layout as analytics.data_analytics.to_categorical
+        """
+        vocabulary = self.vocabulary[name]
+        codes = self.arrays[name][lo:hi]
+        present = set(np.array(vocabulary, dtype=object)[np.unique(codes)]) if hi > lo else set()
+        extra = sorted(present - set(known))
+        values = pd.Categorical.from_codes(codes, categories=vocabulary)
+        return values.set_categories(list(known) + extra)
+
+    def frame(self, start_date=None, end_date=None, columns=SNAPSHOT_COLUMNS, known=None):
+        """
+        Build a DataFrame of the expenses in a date range
+
+        Args:
+            start_date: Optional start date (inclusive day)
+            end_date: Optional end date (inclusive day)
+            columns: Columns to include (must be in SNAPSHOT_COLUMNS)
+            known: Dict of coded column -> known labels for its categories
+
+        Returns:
+            DataFrame, empty if no expenses fall in the range
+        """
+        lo, hi = self.locate(start_date, end_date)
+        if hi == lo:
+            return pd.DataFrame()
+
+        known = known or {}
+        data = {}
+        for name in columns:
+            if name in CODED_COLUMNS:
+                data[name] = self.categorical(name, lo, hi, known.get(name, ()))
+            elif name == 'description':
+                data[name] = self.descriptions(lo, hi)
+            else:
+                data[name] = self.arrays[name][lo:hi]
+        return pd.DataFrame(data, copy=False)
+
+    def table(self):
+        """Decode the whole snapshot into in-memory arrays for merging"""
+        table = {name: np.array(self.arrays[name]) for name in ('expense_id', 'amount', 'base_amount', 'date')}
+        for name in CODED_COLUMNS:
+            table[name] = np.array(self.vocabulary[name], dtype=object)[self.arrays[name]]
+        table['description'] = self.descriptions(0, self.rows)
+        return table
+
+
+def write_snapshot(user_id, table, seq, version):
+    """Atomically replace a user's snapshot file"""
+    fmt = snapshot_format()
+    write, _ = FORMATS[fmt]
+    os.makedirs(Config.ANALYTICS_SNAPSHOT_DIR, exist_ok=True)
+
+    handle, temp_path = tempfile.mkstemp(dir=Config.ANALYTICS_SNAPSHOT_DIR, suffix='.tmp')
+    os.close(handle)
+    try:
+        write(temp_path, table, {'user_id': user_id, 'seq': seq, 'version': version})
+        os.replace(temp_path, snapshot_path(user_id, fmt))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_snapshot(user_id):
+    """Open a user's snapshot file, or return None if there is none"""
+    fmt = snapshot_format()
+    path = snapshot_path(user_id, fmt)
+    if not os.path.exists(path):
+        return None
+    _, read = FORMATS[fmt]
+    try:
+        return ExpenseSnapshot(*read(path))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Snapshot error: {e}")
+        return None
+
+
+def _log_position(user_id, after_seq=0):
+    """
+    Read the delta log since after_seq with the watermark and version,
+    all from one statement
+    """
+    return execute_query(
+        """SELECT w.pruned_through,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version,
+                  d.seq, d.expense_id
+           FROM expense_delta_watermark w
+           LEFT JOIN expense_daily_deltas d ON d.user_id = %s AND d.seq > %s
+           ORDER BY d.seq""",
+        (user_id, user_id, after_seq),
+        fetch=True
+    )
+
+
+def build_snapshot(user_id):
+    """
+    Write a user's snapshot from a full read of their expenses
+
+    The log position is read first; changes racing with the read are
+    replayed by the next refresh, which re-reads rows idempotently.
+    """
+    position = execute_query(
+        """SELECT (SELECT COALESCE(MAX(seq), 0) FROM expense_daily_deltas) AS seq,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version""",
+        (user_id,),
+        fetch_one=True
+    )
+    data = get_user_expense_columns(user_id, columns=SNAPSHOT_COLUMNS)
+    if position is None or data is None:
+        return False
+
+    write_snapshot(user_id, _table_from_columns(data), position['seq'], position['version'])
+    return True
+
+
+def refresh_snapshot(user_id, snapshot):
+    """
+    Merge expenses changed since the snapshot was written
+
+    Falls back to a full rebuild when the log no longer covers the
+    snapshot (pruned, or written before expense ids were logged).
+    """
+    rows = _log_position(user_id, snapshot.seq)
+    if not rows:
+        return False
+
+    changes = [row for row in rows if row['seq'] is not None]
+    if rows[0]['pruned_through'] > snapshot.seq or any(row['expense_id'] is None for row in changes):
+        return build_snapshot(user_id)
+
+    changed = sorted({row['expense_id'] for row in changes})
+    current = {name: [] for name in SNAPSHOT_COLUMNS}
+    for i in range(0, len(changed), MERGE_BATCH_SIZE):
+        batch = changed[i:i + MERGE_BATCH_SIZE]
+        data = execute_query(
+            f"""SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM expenses
+                WHERE user_id = %s AND expense_id IN ({', '.join(['%s'] * len(batch))})""",
+            (user_id, *batch),
+            fetch_columns=True
+        )
+        if data is None:
+            return False
+        for name in SNAPSHOT_COLUMNS:
+            current[name].extend(data[name])
+
+    table = snapshot.table()
+    keep = ~np.isin(table['expense_id'], changed)
+    updates = _table_from_columns(current)
+    merged = {
+        name: np.concatenate([table[name][keep], updates[name].astype(table[name].dtype)])
+        for name in table
+    }
+
+    seq = changes[-1]['seq'] if changes else snapshot.seq
+    write_snapshot(user_id, _sort_newest_first(merged), seq, rows[0]['version'])
+    return True
+
+
+def get_snapshot(user_id):
+    """
+    Get a user's snapshot if it reflects their current data
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        ExpenseSnapshot, or None if there is no file or it is out of date
+    """
+    version = current_data_version(user_id)
+    hit, snapshot = snapshot_cache.get(user_id)
+
+    # The file may have been rewritten since it was cached
+    if not hit or snapshot.version < version:
+        snapshot = read_snapshot(user_id)
+        if snapshot is None or snapshot.version < version:
+            return None
+        snapshot_cache.put(user_id, snapshot)
+    return snapshot
+
+
+def advance_snapshot(user_id):
+    """
+    Build a user's snapshot, or merge in the expenses changed since it
+    was written
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        The up-to-date ExpenseSnapshot, or None if it could not be written
+    """
+    snapshot = read_snapshot(user_id)
+    if snapshot is None or snapshot.version < current_data_version(user_id):
+        written = refresh_snapshot(user_id, snapshot) if snapshot else build_snapshot(user_id)
+        if not written:
+            return None
+        snapshot = read_snapshot(user_id)
+
+    if snapshot is not None:
+        snapshot_cache.put(user_id, snapshot)
+    return snapshot
+
+
+def load_snapshot_frame(user_id, start_date=None, end_date=None, columns=SNAPSHOT_COLUMNS, known=None):
+    """
+    Load a user's expenses for a date range from their snapshot
+
+    Args:
+        user_id: User's ID
+        start_date: Optional start date filter
+        end_date: Optional end date filter
+        columns: Expense columns to load
+        known: Dict of coded column -> known labels for its categories
+
+    Returns:
+        DataFrame, or None when the snapshot cannot serve the request
+    """
+    if any(name not in SNAPSHOT_COLUMNS for name in columns):
+        return None
+
+    snapshot = get_snapshot(user_id)
+    if snapshot is None:
+        return None
+    return snapshot.frame(start_date, end_date, columns, known)
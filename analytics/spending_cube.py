@@ -0,0 +1,247 @@
+"""
+Month x weekday x category spending cube
+
+Each user's daily rollups are folded into two small NumPy arrays, sums
+and counts, indexed by (month, weekday, category). Pattern insights are
+slices and axis sums of the cube, so their cost depends on the number of
+months and categories, not on the number of expenses.
+
+Cubes are saved per user in the spending_cubes table and cached per
+process. When the user's data version moves on, the expense_daily_deltas
+entries logged since the cube was built are added in place of a rebuild.
+Requests only update the process cache; the saved cube is advanced by
+the forecast precompute job (see predictions.precompute).
+"""
+import calendar
+import json
+import numpy as np
+from config import Config
+from database.connection import execute_query, execute_write
+from analytics.cache import AnalyticsCache, current_data_version
+from analytics.range_index import _as_days
+
+
+spending_cube_cache = AnalyticsCache(Config.SPENDING_CUBE_CACHE_SIZE)
+
+WEEKDAYS = list(calendar.day_name)  # Monday first, as datetime.weekday()
+
+
+def _coordinates(rows):
+    """Month (datetime64[M]) and weekday (0 = Monday) of each row's day"""
+    days = _as_days(row['day'] for row in rows)
+    # 1970-01-01 was a Thursday
+    return days.astype('datetime64[M]'), (days.astype(np.int64) + 3) % 7
+
+
+class SpendingCube:
+    """Spending sums and counts per month, weekday and category for one user"""
+
+    def __init__(self, months, categories, sums, counts, seq, version):
+        self.months = months            # Sorted datetime64[M], one entry per month with expenses
+        self.categories = categories    # Labels of the last axis
+        self.sums = sums                # (len(months), 7, len(categories)) float64
+        self.counts = counts            # Same shape, int64
+        self.seq = seq                  # Last delta log entry reflected in the cube
+        self.version = version          # User data version at that point
+
+    @classmethod
+    def build(cls, rows, seq, version):
+        """
+        Build a cube from daily rollup rows
+
+        Args:
+            rows: Dicts with day, category, total and count
+            seq: Last delta log entry the rows include
+            version: User data version the rows correspond to
+        """
+        months = np.unique(_coordinates(rows)[0])
+        categories = sorted({row['category'] for row in rows})
+        shape = (len(months), 7, len(categories))
+
+        cube = cls(months, categories, np.zeros(shape), np.zeros(shape, dtype=np.int64), seq, version)
+        cube._add(rows)
+        return cube
+
+    def _add(self, rows):
+        """Add rows in place (only on arrays this cube owns)"""
+        if not rows:
+            return
+        months, weekdays = _coordinates(rows)
+        column = {category: i for i, category in enumerate(self.categories)}
+        position = (np.searchsorted(self.months, months), weekdays,
+                    np.array([column[row['category']] for row in rows]))
+        np.add.at(self.sums, position, [row['total'] for row in rows])
+        np.add.at(self.counts, position, [row['count'] for row in rows])
+
+    def apply(self, deltas, seq, version):
+        """
+        Return a new cube with signed daily deltas added
+
+        Args:
+            deltas: Dicts with day, category, total and count
+            seq: Last delta log entry included in deltas
+            version: User data version after the deltas
+        """
+        new_categories = sorted({row['category'] for row in deltas} - set(self.categories))
+        padding = ((0, 0), (0, 0), (0, len(new_categories)))
+        cube = SpendingCube(self.months, self.categories + new_categories,
+                            np.pad(self.sums, padding), np.pad(self.counts, padding), seq, version)
+
+        if deltas:
+            months, _ = _coordinates(deltas)
+            new_months = np.setdiff1d(months, cube.months)
+            if len(new_months):
+                positions = np.searchsorted(cube.months, new_months)
+                cube.months = np.insert(cube.months, positions, new_months)
+                cube.sums = np.insert(cube.sums, positions, 0.0, axis=0)
+                cube.counts = np.insert(cube.counts, positions, 0, axis=0)
+            cube._add(deltas)
+        return cube
+
+    def window(self, start_month=None, end_month=None):
+        """
+        Sums and counts for an inclusive range of months
+
+        Args:
+            start_month: Optional 'YYYY-MM' start
+            end_month: Optional 'YYYY-MM' end
+
+        Returns:
+            Tuple of (sums, counts), each (7, len(categories))
+        """
+        lo = 0 if start_month is None else int(np.searchsorted(self.months, np.datetime64(start_month, 'M')))
+        hi = len(self.months) if end_month is None else int(
+            np.searchsorted(self.months, np.datetime64(end_month, 'M'), side='right'))
+        return self.sums[lo:hi].sum(axis=0), self.counts[lo:hi].sum(axis=0)
+
+    def to_row(self):
+        return (
+            self.seq, self.version,
+            json.dumps([str(month) for month in self.months]), json.dumps(self.categories),
+            self.sums.tobytes(), self.counts.tobytes()
+        )
+
+    @classmethod
+    def from_row(cls, row):
+        months = np.array(json.loads(row['months']), dtype='datetime64[M]')
+        categories = json.loads(row['categories'])
+        shape = (len(months), 7, len(categories))
+        return cls(
+            months, categories,
+            np.frombuffer(row['sums'], dtype=np.float64).reshape(shape).copy(),
+            np.frombuffer(row['counts'], dtype=np.int64).reshape(shape).copy(),
+            row['seq'], row['version']
+        )
+
+
+def load_spending_cube(user_id):
+    """
+    Build a user's cube from the daily rollups
+
+    The delta log position and data version are read in the same
+    statement as the rollups, so they describe the same snapshot.
+    """
+    rows = execute_query(
+        """SELECT NULL AS day, NULL AS category, 0 AS total, 0 AS count,
+                  (SELECT COALESCE(MAX(seq), 0) FROM expense_daily_deltas) AS seq,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version
+           UNION ALL
+           SELECT day, category, total, count, NULL, NULL
+           FROM expense_daily_rollups WHERE user_id = %s""",
+        (user_id, user_id),
+        fetch=True
+    )
+    if rows is None:
+        return None
+
+    header = next(row for row in rows if row['day'] is None)
+    return SpendingCube.build([row for row in rows if row['day'] is not None],
+                              header['seq'], header['version'])
+
+
+def refresh_spending_cube(user_id, cube):
+    """
+    Bring a cube up to date by adding the delta log entries since it was
+    built, or rebuild it if some of them were pruned
+    """
+    rows = execute_query(
+        """SELECT w.pruned_through,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version,
+                  d.seq, d.day, d.category, d.total, d.count
+           FROM expense_delta_watermark w
+           LEFT JOIN expense_daily_deltas d ON d.user_id = %s AND d.seq > %s
+           ORDER BY d.seq""",
+        (user_id, user_id, cube.seq),
+        fetch=True
+    )
+    if not rows or rows[0]['pruned_through'] > cube.seq:
+        return load_spending_cube(user_id)
+
+    deltas = [row for row in rows if row['seq'] is not None]
+    seq = deltas[-1]['seq'] if deltas else cube.seq
+    return cube.apply(deltas, seq, rows[0]['version'])
+
+
+def save_spending_cube(user_id, cube):
+    """Persist a user's cube, replacing the previous one"""
+    return execute_write(
+        """INSERT OR REPLACE INTO spending_cubes (user_id, seq, version, months, categories, sums, counts)
+           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        (user_id, *cube.to_row())
+    )
+
+
+def get_spending_cube(user_id):
+    """
+    Get a user's up-to-date spending cube without saving it
+
+    Looks in the process cache, then the spending_cubes table, and
+    caches the cube in this process once it is brought up to date.
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        SpendingCube, or None if the database is unavailable
+    """
+    version = current_data_version(user_id)
+    hit, cube = spending_cube_cache.get(user_id)
+
+    if not hit:
+        row = execute_query(
+            "SELECT seq, version, months, categories, sums, counts FROM spending_cubes WHERE user_id = %s",
+            (user_id,),
+            fetch_one=True
+        )
+        cube = SpendingCube.from_row(row) if row else None
+
+    if cube is not None and cube.version >= version:
+        if not hit:
+            spending_cube_cache.put(user_id, cube)
+        return cube
+
+    cube = refresh_spending_cube(user_id, cube) if cube is not None else load_spending_cube(user_id)
+    if cube is not None:
+        spending_cube_cache.put(user_id, cube)
+    return cube
+
+
+def advance_spending_cube(user_id):
+    """
+    Bring a user's saved spending cube up to date
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        The saved SpendingCube, or None if the database is unavailable
+    """
+    saved = execute_query(
+        "SELECT seq, version FROM spending_cubes WHERE user_id = %s",
+        (user_id,),
+        fetch_one=True
+    )
+    cube = get_spending_cube(user_id)
+    if cube is not None and (not saved or (saved['seq'], saved['version']) != (cube.seq, cube.version)):
+        save_spending_cube(user_id, cube)
+    return cube
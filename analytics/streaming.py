@@ -0,0 +1,101 @@
+"""
+Chunked streaming analytics for very large expense histories
+
+Expenses are read from the cursor in fixed-size batches and folded into
+running aggregates (sums, counts, extrema, per-category and per-month
+totals), so peak memory depends on the chunk size rather than on how much
+history a user has. Results have the same shape as
+analytics.windows.compute_window_stats.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from config import Config
+from expenses.expense_manager import iter_user_expense_chunks, to_start_day
+
+
+class RunningAggregate:
+    """Running totals for one window, folded one chunk at a time"""
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.max = None
+        self.min = None
+        self.categories = {}
+        self.months = {}
+
+    def fold(self, amounts, categories, months):
+        """
+        Fold one chunk into the running aggregates
+
+        Args:
+            amounts: float64 array of base amounts
+            categories: Array of category labels, aligned with amounts
+            months: Array of 'YYYY-MM' labels, aligned with amounts
+        """
+        if not len(amounts):
+            return
+
+        self.total += float(amounts.sum())
+        self.count += len(amounts)
+        chunk_max, chunk_min = float(amounts.max()), float(amounts.min())
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+
+        labels, codes = np.unique(categories, return_inverse=True)
+        for label, amount in zip(labels, np.bincount(codes, weights=amounts, minlength=len(labels))):
+            label = str(label)
+            self.categories[label] = self.categories.get(label, 0.0) + float(amount)
+
+        labels, codes = np.unique(months, return_inverse=True)
+        for label, amount in zip(labels, np.bincount(codes, weights=amounts, minlength=len(labels))):
+            label = str(label)
+            self.months[label] = self.months.get(label, 0.0) + float(amount)
+
+    def result(self):
+        return {
+            'total': self.total,
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max if self.max is not None else 0.0,
+            'min': self.min if self.min is not None else 0.0,
+            'categories': dict(sorted(self.categories.items())),
+            'months': dict(sorted(self.months.items()))
+        }
+
+
+def stream_window_stats(user_id, windows, end_date=None, chunk_size=None):
+    """
+    Compute trailing-window statistics without materializing the history
+
+    Args:
+        user_id: User's ID
+        windows: Iterable of window lengths in days
+        end_date: Window end (default: now)
+        chunk_size: Rows per batch (default: Config.ANALYTICS_CHUNK_SIZE)
+
+    Returns:
+        Dict of window length -> statistics dict
+    """
+    windows = list(windows)
+    end_date = end_date or datetime.now()
+    chunk_size = chunk_size or Config.ANALYTICS_CHUNK_SIZE
+
+    starts = {days: to_start_day(end_date - timedelta(days=days)) for days in windows}
+    aggregates = {days: RunningAggregate() for days in windows}
+
+    chunks = iter_user_expense_chunks(
+        user_id, min(starts.values()), end_date,
+        columns=('date', 'category', 'base_amount'), chunk_size=chunk_size
+    )
+    for chunk in chunks:
+        dates = np.array(chunk['date'], dtype=object).astype(str)
+        amounts = np.array(chunk['base_amount'], dtype=np.float64)
+        categories = np.array([c if c is not None else 'Other' for c in chunk['category']], dtype=object).astype(str)
+        months = dates.astype('U7')  # 'YYYY-MM'
+
+        for days, aggregate in aggregates.items():
+            mask = dates >= starts[days]
+            aggregate.fold(amounts[mask], categories[mask], months[mask])
+
+    return {days: aggregate.result() for days, aggregate in aggregates.items()}
@@ -0,0 +1,108 @@
+"""
+Single-pass statistics over several trailing date windows
+
+All trailing windows share the same end date, so on date-sorted data each
+window is a suffix of the array. One cumulative sum (overall and per
+category) and one reverse running max/min answer every window with a
+couple of index lookups.
+"""
+from datetime import datetime, timedelta
+import numpy as np
+from expenses.expense_manager import to_start_day
+
+
+def _empty_window():
+    return {
+        'total': 0.0,
+        'count': 0,
+        'mean': 0.0,
+        'max': 0.0,
+        'min': 0.0,
+        'categories': {},
+        'months': {}
+    }
+
+
+def compute_window_stats(df, windows, end_date=None):
+    """
+    Compute totals, counts, means, extrema, per-category and per-month
+    sums for trailing windows ending at end_date
+
+    A window of N days covers the expenses get_expense_dataframe returns
+    for (end_date - N days, end_date): a datetime start excludes its own
+    day (see to_start_day).
+
+    Args:
+        df: Expense DataFrame with date, base_amount and category columns
+        windows: Iterable of window lengths in days
+        end_date: Window end (default: now)
+
+    Returns:
+        Dict of window length -> statistics dict
+    """
+    windows = list(windows)
+    if df.empty:
+        return {days: _empty_window() for days in windows}
+
+    end_date = end_date or datetime.now()
+    end_day = np.datetime64(end_date.strftime('%Y-%m-%d'), 'D')
+
+    dates = df['date'].values.astype('datetime64[D]')
+    order = np.argsort(dates, kind='stable')
+    dates = dates[order]
+    amounts = df['base_amount'].to_numpy(dtype=np.float64)[order]
+    categories, codes = np.unique(df['category'].to_numpy(dtype=object)[order].astype(str),
+                                  return_inverse=True)
+
+    # Drop anything after the end date so every window is a suffix
+    stop = int(np.searchsorted(dates, end_day, side='right'))
+    dates, amounts, codes = dates[:stop], amounts[:stop], codes[:stop]
+    months, month_codes = np.unique(dates.astype('datetime64[M]'), return_inverse=True)
+
+    cumulative = np.concatenate(([0.0], np.cumsum(amounts)))
+
+    # Per-category prefix sums and counts: row i holds totals of the first i expenses
+    one_hot = np.zeros((stop, len(categories)))
+    one_hot[np.arange(stop), codes] = 1.0
+    category_counts = np.vstack([np.zeros(len(categories)), np.cumsum(one_hot, axis=0)])
+    one_hot[np.arange(stop), codes] = amounts
+    category_sums = np.vstack([np.zeros(len(categories)), np.cumsum(one_hot, axis=0)])
+
+    # suffix_max[i] / suffix_min[i] cover expenses i..stop-1
+    suffix_max = np.maximum.accumulate(amounts[::-1])[::-1]
+    suffix_min = np.minimum.accumulate(amounts[::-1])[::-1]
+
+    results = {}
+    for days in windows:
+        start_day = np.datetime64(to_start_day(end_date - timedelta(days=days)), 'D')
+        start = int(np.searchsorted(dates, start_day, side='left'))
+        count = stop - start
+        if count <= 0:
+            results[days] = _empty_window()
+            continue
+
+        total = cumulative[stop] - cumulative[start]
+        window_counts = category_counts[stop] - category_counts[start]
+        window_sums = category_sums[stop] - category_sums[start]
+
+        results[days] = {
+            'total': float(total),
+            'count': int(count),
+            'mean': float(total / count),
+            'max': float(suffix_max[start]),
+            'min': float(suffix_min[start]),
+            'categories': {
+                str(category): float(amount)
+                for category, amount, n in zip(categories, window_sums, window_counts) if n > 0
+            },
+            'months': {
+                str(month): float(amount)
+                for month, amount, n in zip(
+                    months,
+                    np.bincount(month_codes[start:], weights=amounts[start:], minlength=len(months)),
+                    np.bincount(month_codes[start:], minlength=len(months))
+                ) if n > 0
+            }
+        }
+
+    return results
@@ -12,25 +12,31 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
-from database.connection import init_database
+from database.connection import init_database, init_app as init_db_app
 from auth.auth_module import create_user, authenticate_user, get_user_by_id
 from expenses.expense_manager import (
-    add_expense, get_expense, get_user_expenses, 
+    add_expense, add_expenses_bulk, get_expense, get_user_expenses, 
+    get_user_expenses_page, get_user_expenses_summary,
     update_expense, delete_expense, get_categories
 )
+from expenses.anomalies import get_anomalies, get_expense_anomaly
 from currency.converter import (
     convert_currency, get_supported_currencies, 
     get_exchange_rate, fetch_exchange_rates
 )
+from analytics.context import analytics_context
 from analytics.data_analytics import (
     get_monthly_summary, get_category_distribution,
     get_daily_spending_trend, get_spending_statistics,
-    estimate_monthly_savings, get_monthly_totals
+    estimate_monthly_savings, get_monthly_totals,
+    get_range_summary
 )
 from predictions.prediction_engine import (
     predict_next_month_spending, get_spending_forecast,
-    analyze_spending_pattern
+    analyze_spending_pattern, predict_all_category_spending,
+    get_forecast_engine, set_forecast_engine
 )
+from predictions.precompute import get_precomputed_forecasts, start_forecast_scheduler
 from visualizations.charts import (
     create_monthly_spending_chart, create_category_bar_chart,
     create_daily_trend_chart, create_prediction_comparison_chart,
@@ -42,6 +48,9 @@ app = Flask(__name__)
 app.config.from_object(Config)
 app.secret_key = Config.SECRET_KEY
 
+# Return pooled database connections at the end of each app context
+init_db_app(app)
+
 # Login required decorator
 def login_required(f):
     @wraps(f)
@@ -53,6 +62,15 @@ def login_required(f):
     return decorated_function
 
 
+# Serve every analytics/prediction/chart call in a route from one expense load
+def shared_analytics(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with analytics_context(session['user_id']):
+            return f(*args, **kwargs)
+    return decorated_function
+
+
 # ==================== Public Routes ====================
 
 @app.route('/')
@@ -147,6 +165,7 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@shared_analytics
 def dashboard():
     """Main dashboard with summary and charts"""
     user_id = session['user_id']
@@ -155,8 +174,9 @@ def dashboard():
     current_month = datetime.now()
     monthly_summary = get_monthly_summary(user_id, current_month.year, current_month.month)
     
-    # Get prediction
-    prediction = predict_next_month_spending(user_id)
+    # Get prediction, precomputed unless the user's data has changed since
+    precomputed = get_precomputed_forecasts(user_id)
+    prediction = precomputed['next_month'] if precomputed else predict_next_month_spending(user_id)
     
     # Get recent expenses
     recent_expenses = get_user_expenses(user_id, limit=5)
@@ -164,6 +184,9 @@ def dashboard():
     # Get statistics
     stats = get_spending_statistics(user_id)
     
+    # Unusual expenses flagged as they were added
+    anomalies = get_anomalies(user_id, limit=5)
+    
     # Generate charts
     monthly_chart = create_monthly_spending_chart(user_id)
     category_chart = create_pie_chart(user_id)
@@ -173,6 +196,7 @@ def dashboard():
         prediction=prediction,
         recent_expenses=recent_expenses,
         stats=stats,
+        anomalies=anomalies,
         monthly_chart=monthly_chart,
         category_chart=category_chart
     )
@@ -219,6 +243,10 @@ def add_expense_page():
             
             if expense_id:
                 flash('Expense added successfully!', 'success')
+                anomaly = get_expense_anomaly(expense_id, user_id)
+                if anomaly:
+                    flash(f"This is {anomaly['times_typical']}x your typical {category} expense "
+                          f"of ₹{anomaly['typical_amount']:,.2f}.", 'warning')
                 return redirect(url_for('dashboard'))
             else:
                 flash('Failed to add expense. Please try again.', 'error')
@@ -314,12 +342,20 @@ def expenses_list():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     category = request.args.get('category')
+    cursor = request.args.get('cursor')
+    page_size = request.args.get('page_size', type=int)
     
-    expenses = get_user_expenses(user_id, start_date, end_date, category)
+    page = get_user_expenses_page(user_id, start_date, end_date, category,
+                                  cursor=cursor, page_size=page_size)
+    summary = get_user_expenses_summary(user_id, start_date, end_date, category)
     categories = get_categories()
     
     return render_template('expenses.html', 
-        expenses=expenses, 
+        expenses=page['expenses'], 
+        next_cursor=page['next_cursor'],
+        is_first_page=not cursor,
+        page_size=page_size,
+        summary=summary,
         categories=categories,
         filters={
             'start_date': start_date,
@@ -330,6 +366,7 @@ def expenses_list():
 
 @app.route('/analytics')
 @login_required
+@shared_analytics
 def analytics_page():
     """Full analytics page with Pandas data"""
     user_id = session['user_id']
@@ -365,17 +402,24 @@ def analytics_page():
 
 @app.route('/predict')
 @login_required
+@shared_analytics
 def predict_page():
     """ML prediction page"""
     user_id = session['user_id']
     
-    # Get predictions
-    next_month_prediction = predict_next_month_spending(user_id)
-    forecast = get_spending_forecast(user_id, 3)
-    pattern_analysis = analyze_spending_pattern(user_id)
+    # Get predictions, precomputed unless the user's data has changed since
+    precomputed = get_precomputed_forecasts(user_id)
+    if precomputed:
+        next_month_prediction = precomputed['next_month']
+        forecast = precomputed['forecast']
+        pattern_analysis = precomputed['pattern']
+    else:
+        next_month_prediction = predict_next_month_spending(user_id)
+        forecast = get_spending_forecast(user_id, 3)
+        pattern_analysis = analyze_spending_pattern(user_id, next_month_prediction)
     
     # Get comparison chart
-    comparison_chart = create_prediction_comparison_chart(user_id)
+    comparison_chart = create_prediction_comparison_chart(user_id, next_month_prediction)
     monthly_chart = create_monthly_spending_chart(user_id)
     
     return render_template('predict.html',
@@ -444,13 +488,47 @@ def api_summary():
     })
 
 
+@app.route('/api/range-summary')
+@login_required
+def api_range_summary():
+    """API endpoint for spending totals over any date range"""
+    user_id = session['user_id']
+    
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start_date = datetime.strptime(start, '%Y-%m-%d') if start else None
+        end_date = datetime.strptime(end, '%Y-%m-%d') if end else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Dates must be in YYYY-MM-DD format'
+        }), 400
+    
+    if start_date and end_date and start_date > end_date:
+        return jsonify({
+            'success': False,
+            'error': 'start must not be after end'
+        }), 400
+    
+    summary = get_range_summary(user_id, start_date, end_date)
+    
+    return jsonify({
+        'success': True,
+        'start': start,
+        'end': end,
+        'summary': summary
+    })
+
+
 @app.route('/api/prediction')
 @login_required
 def api_prediction():
     """API endpoint for spending prediction"""
     user_id = session['user_id']
     
-    prediction = predict_next_month_spending(user_id)
+    precomputed = get_precomputed_forecasts(user_id)
+    prediction = precomputed['next_month'] if precomputed else predict_next_month_spending(user_id)
     
     return jsonify({
         'success': True,
@@ -458,6 +536,107 @@ def api_prediction():
     })
 
 
+@app.route('/api/prediction/engine', methods=['GET', 'POST'])
+@login_required
+def api_prediction_engine():
+    """API endpoint for reading or choosing the user's forecast engine"""
+    user_id = session['user_id']
+    
+    if request.method == 'POST':
+        payload = request.get_json(silent=True)
+        engine = payload.get('engine') if isinstance(payload, dict) else None
+        
+        try:
+            updated = set_forecast_engine(user_id, engine)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        if not updated:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to update forecast engine'
+            }), 500
+    
+    return jsonify({
+        'success': True,
+        'engine': get_forecast_engine(user_id)
+    })
+
+
+@app.route('/api/predictions/categories')
+@login_required
+def api_category_predictions():
+    """API endpoint for next month's spending prediction per category"""
+    user_id = session['user_id']
+    
+    predictions = predict_all_category_spending(user_id)
+    
+    return jsonify({
+        'success': True,
+        'predictions': predictions
+    })
+
+
+@app.route('/api/anomalies')
+@login_required
+def api_anomalies():
+    """API endpoint for unusual expenses, newest first"""
+    user_id = session['user_id']
+    
+    limit = request.args.get('limit', 20, type=int)
+    min_zscore = request.args.get('min_zscore', type=float)
+    
+    anomalies = get_anomalies(user_id, limit=min(max(limit, 1), 100), min_zscore=min_zscore)
+    
+    return jsonify({
+        'success': True,
+        'anomalies': anomalies
+    })
+
+
+@app.route('/api/expenses/bulk', methods=['POST'])
+@login_required
+def api_expenses_bulk():
+    """API endpoint for importing many expenses in one transaction"""
+    user_id = session['user_id']
+    payload = request.get_json(silent=True)
+    
+    rows = payload.get('expenses') if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        return jsonify({
+            'success': False,
+            'error': 'Expected a JSON list of expenses'
+        }), 400
+    
+    if len(rows) > Config.BULK_IMPORT_MAX_ROWS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {Config.BULK_IMPORT_MAX_ROWS} expenses per request'
+        }), 413
+    
+    try:
+        inserted = add_expenses_bulk(user_id, rows)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    if inserted is None:
+        return jsonify({
+            'success': False,
+            'error': 'Failed to import expenses'
+        }), 500
+    
+    return jsonify({
+        'success': True,
+        'inserted': inserted
+    })
+
+
 # ==================== Error Handlers ====================
 
 @app.errorhandler(404)
@@ -477,6 +656,11 @@ if __name__ == '__main__':
     print("Initializing database...")
     init_database()
     
+    # Keep the predictions table fresh in the background. With the debug
+    # reloader only the child process (WERKZEUG_RUN_MAIN) serves requests.
+    if Config.FORECAST_SCHEDULER_ENABLED and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_forecast_scheduler()
+    
     # Run the app
     print("Starting Finance Tracker...")
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,346 @@
+"""
+Backtest: accuracy and throughput of the forecasting functions
+
+Expense histories (synthetic, or read from an existing database with
+users renumbered and descriptions dropped) are replayed month by month.
+For each cutoff month, every history is truncated to the same day of that
+month as today and shifted forward by whole months so the cutoff lands on
+the current month; the prediction functions then run unmodified against
+a scratch database, and their forecasts are scored against what the
+history actually spent afterwards.
+
+The JSON report holds MAE/MAPE per function and engine, fits per second
+and per-user latency, so runs from different revisions can be diffed.
+
+Usage:
+    python benchmarks/backtest_forecasts.py [--users 20] [--months 36] [--cutoffs 12]
+                                            [--database finance_tracker.db]
+                                            [--output backtest_report.json] [--label NAME]
+"""
+import argparse
+import calendar
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database.connection import get_db_connection, execute_many, execute_query, close_all_connections
+from database.migrations import run_migrations
+from expenses.expense_manager import EXPENSE_CATEGORIES
+from predictions.prediction_engine import (
+    predict_next_month_spending, predict_category_spending, get_spending_forecast,
+    fit_linear_trend, model_cache, FORECAST_ENGINES
+)
+from predictions.batch_forecast import fit_many
+from predictions.smoothing import SmoothingState, smoothing_state_cache
+from analytics.cache import analytics_cache
+
+HORIZONS = 3
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def shift_date(value, months):
+    """Move a 'YYYY-MM-DD' date by whole months, clipping the day"""
+    index = int(value[:4]) * 12 + int(value[5:7]) - 1 + months
+    year, month = divmod(index, 12)
+    day = min(int(value[8:10]), calendar.monthrange(year, month + 1)[1])
+    return f"{year:04d}-{month + 1:02d}-{day:02d}"
+
+
+def synthetic_histories(users, months, seed=42):
+    """
+    Daily expenses with a level, linear trend, yearly seasonality and noise
+
+    Returns:
+        List of per-user lists of (date, category, amount), ending with
+        last month
+    """
+    rng = np.random.default_rng(seed)
+    last = month_index(date.today()) - 1
+    histories = []
+    for _ in range(users):
+        base = rng.uniform(20000, 60000)
+        slope = rng.normal(0, 0.01) * base
+        amplitude, phase = rng.uniform(0, 0.2) * base, rng.uniform(0, 2 * np.pi)
+        weights = rng.dirichlet(np.ones(len(EXPENSE_CATEGORIES)))
+
+        rows = []
+        for step, index in enumerate(range(last - months + 1, last + 1)):
+            year, month = divmod(index, 12)
+            target = base + slope * step + amplitude * np.sin(2 * np.pi * (month + phase) / 12)
+            target = max(1000.0, target * rng.normal(1, 0.1))
+
+            count = int(rng.integers(20, 40))
+            amounts = rng.dirichlet(np.ones(count)) * target
+            days = rng.integers(1, calendar.monthrange(year, month + 1)[1] + 1, count)
+            categories = rng.choice(EXPENSE_CATEGORIES, count, p=weights)
+            rows.extend((f"{year:04d}-{month + 1:02d}-{day:02d}", str(category), round(float(amount), 2))
+                        for day, category, amount in zip(days, categories, amounts))
+        histories.append(rows)
+    return histories
+
+
+def database_histories(path):
+    """Read histories from an existing database, keeping only date, category and amount"""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = connection.execute(
+            "SELECT user_id, date, category, base_amount FROM expenses ORDER BY user_id, date"
+        ).fetchall()
+    finally:
+        connection.close()
+
+    by_user = {}
+    for user_id, day, category, amount in rows:
+        by_user.setdefault(user_id, []).append((str(day)[:10], category or 'Other', amount))
+    return list(by_user.values())
+
+
+def monthly_actuals(history):
+    """(month index, category) -> total, with None as the all-categories key"""
+    actuals = {}
+    for day, category, amount in history:
+        index = int(day[:4]) * 12 + int(day[5:7]) - 1
+        for key in ((index, None), (index, category)):
+            actuals[key] = actuals.get(key, 0.0) + amount
+    return actuals
+
+
+def build_replays(histories, cutoffs, min_months=7):
+    """
+    Plan one scratch user per (history, cutoff)
+
+    Returns:
+        List of dicts with the shifted expenses and actual totals for
+        the HORIZONS months after the cutoff
+    """
+    today = date.today()
+    replays = []
+    for history in histories:
+        if not history:
+            continue
+        first = min(int(d[:4]) * 12 + int(d[5:7]) - 1 for d, _, _ in history)
+        last = max(int(d[:4]) * 12 + int(d[5:7]) - 1 for d, _, _ in history)
+        actuals = monthly_actuals(history)
+
+        candidates = range(max(first + min_months, last - HORIZONS - cutoffs + 1), last - HORIZONS + 1)
+        for cutoff in candidates:
+            shift = month_index(today) - cutoff
+            limit = f"{cutoff // 12:04d}-{cutoff % 12 + 1:02d}-{today.day:02d}"
+            expenses = [(shift_date(d, shift), category, amount)
+                        for d, category, amount in history if d <= limit]
+            categories = sorted({category for _, category, _ in expenses})
+            replays.append({
+                'expenses': expenses,
+                'actual': [actuals.get((cutoff + h, None), 0.0) for h in range(1, HORIZONS + 1)],
+                'categories': {c: actuals.get((cutoff + 1, c), 0.0) for c in categories}
+            })
+    return replays
+
+
+def load_replays(replays):
+    """Insert one user per replay into the scratch database; returns user IDs"""
+    first_id = (execute_query("SELECT COALESCE(MAX(user_id), 0) AS n FROM users", fetch_one=True)['n']) + 1
+    user_ids = list(range(first_id, first_id + len(replays)))
+    execute_many(
+        "INSERT INTO users (user_id, username, email, password_hash, salt) VALUES (%s, %s, %s, '', '')",
+        [(user_id, f"replay{user_id}", f"replay{user_id}@example.com") for user_id in user_ids]
+    )
+    execute_many(
+        """INSERT INTO expenses (user_id, amount, base_amount, currency, category, date)
+           VALUES (%s, %s, %s, 'INR', %s, %s)""",
+        [(user_id, amount, amount, category, day)
+         for user_id, replay in zip(user_ids, replays)
+         for day, category, amount in replay['expenses']]
+    )
+    return user_ids
+
+
+def score(pairs):
+    """
+    MAE, MAPE (over non-zero actuals) and WAPE of (predicted, actual)
+    pairs. WAPE divides total error by total spending, so small
+    categories cannot dominate it the way they can MAPE.
+    """
+    if not pairs:
+        return {'n': 0, 'mae': None, 'mape': None, 'wape': None}
+    predicted, actual = np.array(pairs, dtype=np.float64).T
+    errors = np.abs(predicted - actual)
+    nonzero = actual != 0
+    return {
+        'n': len(pairs),
+        'mae': round(float(errors.mean()), 2),
+        'mape': round(float(np.mean(errors[nonzero] / actual[nonzero]) * 100), 2) if nonzero.any() else None,
+        'wape': round(float(errors.sum() / actual.sum() * 100), 2) if actual.sum() else None
+    }
+
+
+def percentiles(seconds):
+    ms = np.array(seconds) * 1000
+    return {
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3)
+    }
+
+
+def clear_caches():
+    """Drop in-process caches and saved smoothing states so the next calls are cold"""
+    analytics_cache.clear()
+    model_cache.clear()
+    smoothing_state_cache.clear()
+    execute_query("DELETE FROM forecast_states")
+
+
+def run_accuracy(user_ids, replays):
+    """Score every function and engine on every replay, timing each call"""
+    accuracy = {}
+    latency = {}
+
+    for engine in FORECAST_ENGINES:
+        next_month, horizons = [], [[] for _ in range(HORIZONS)]
+        cold, warm = [], []
+        clear_caches()
+
+        for user_id, replay in zip(user_ids, replays):
+            started = time.perf_counter()
+            prediction = predict_next_month_spending(user_id, engine)
+            cold.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            predict_next_month_spending(user_id, engine)
+            warm.append(time.perf_counter() - started)
+
+            if prediction['prediction'] is not None:
+                next_month.append((prediction['prediction'], replay['actual'][0]))
+            for h, item in enumerate(get_spending_forecast(user_id, HORIZONS, engine)):
+                horizons[h].append((item['predicted_spending'], replay['actual'][h]))
+
+        accuracy[engine] = {
+            'predict_next_month_spending': score(next_month),
+            'get_spending_forecast': {f"h{h + 1}": score(pairs) for h, pairs in enumerate(horizons)}
+        }
+        latency[engine] = {'cold': percentiles(cold), 'warm': percentiles(warm)}
+
+    categories = []
+    category_latency = []
+    for user_id, replay in zip(user_ids, replays):
+        for category, actual in replay['categories'].items():
+            started = time.perf_counter()
+            prediction = predict_category_spending(user_id, category)
+            category_latency.append(time.perf_counter() - started)
+            if prediction['prediction'] is not None:
+                categories.append((prediction['prediction'], actual))
+
+    accuracy['linear']['predict_category_spending'] = score(categories)
+    latency['linear']['predict_category_spending'] = percentiles(category_latency)
+    return accuracy, latency
+
+
+def run_throughput(series_count, seed=42):
+    """Model fits (or state updates) per second, independent of the database"""
+    rng = np.random.default_rng(seed)
+    series = [rng.gamma(2.0, 5000.0, 6) for _ in range(series_count)]
+    months = [f"{2000 + i // 12:04d}-{i % 12 + 1:02d}" for i in range(series_count)]
+
+    started = time.perf_counter()
+    for y in series:
+        fit_linear_trend(y)
+    linear_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    fit_many(series)
+    batch_seconds = time.perf_counter() - started
+
+    state = SmoothingState()
+    totals = rng.gamma(2.0, 5000.0, series_count)
+    started = time.perf_counter()
+    for month, total in zip(months, totals):
+        state.update(month, total)
+    smoothing_seconds = time.perf_counter() - started
+
+    return {
+        'fit_linear_trend_per_sec': round(series_count / linear_seconds, 1),
+        'fit_many_series_per_sec': round(series_count / batch_seconds, 1),
+        'smoothing_updates_per_sec': round(series_count / smoothing_seconds, 1)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='Synthetic histories')
+    parser.add_argument('--months', type=int, default=36, help='Months per synthetic history')
+    parser.add_argument('--cutoffs', type=int, default=12, help='Replay points per history')
+    parser.add_argument('--database', help='Replay this database instead of synthetic histories')
+    parser.add_argument('--series', type=int, default=20000, help='Series for the throughput section')
+    parser.add_argument('--output', default='backtest_report.json')
+    parser.add_argument('--label', help='Name recorded in the report, e.g. a branch')
+    args = parser.parse_args()
+
+    if args.database:
+        histories = database_histories(args.database)
+        source = {'type': 'database', 'histories': len(histories)}
+    else:
+        histories = synthetic_histories(args.users, args.months)
+        source = {'type': 'synthetic', 'histories': len(histories), 'months': args.months}
+    replays = build_replays(histories, args.cutoffs)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        Config.DATABASE_PATH = os.path.join(scratch, 'backtest.db')
+        connection = get_db_connection()
+        run_migrations(connection)
+        connection.close()
+
+        user_ids = load_replays(replays)
+        accuracy, latency = run_accuracy(user_ids, replays)
+        close_all_connections()
+
+    report = {
+        'label': args.label,
+        'revision': git_revision(),
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'replays': len(replays),
+        'accuracy': accuracy,
+        'latency': latency,
+        'throughput': run_throughput(args.series)
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{len(replays)} replays from {source['histories']} {source['type']} histories -> {args.output}")
+    print(f"{'engine':<14} {'next MAE':>10} {'next MAPE':>10} {'h3 MAPE':>9} {'cold p50 ms':>12} {'warm p50 ms':>12}")
+    for engine in FORECAST_ENGINES:
+        scores = accuracy[engine]
+        print(f"{engine:<14} {scores['predict_next_month_spending']['mae'] or 0:>10.2f} "
+              f"{scores['predict_next_month_spending']['mape'] or 0:>10.2f} "
+              f"{scores['get_spending_forecast']['h3']['mape'] or 0:>9.2f} "
+              f"{latency[engine]['cold']['p50_ms']:>12.3f} {latency[engine]['warm']['p50_ms']:>12.3f}")
+    categories = accuracy['linear']['predict_category_spending']
+    print(f"predict_category_spending MAPE {categories['mape']}, WAPE {categories['wape']}")
+    for name, value in report['throughput'].items():
+        print(f"{name:<28} {value:>12,.1f}")
+
+
+if __name__ == '__main__':
+    main()
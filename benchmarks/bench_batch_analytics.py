@@ -0,0 +1,80 @@
+"""
+Benchmark: per-user summary loop vs the one-pass batch job
+
+Seeds a throwaway SQLite database with synthetic users, then times
+get_monthly_summary + get_category_distribution + get_spending_statistics
+called per user against analytics.batch.compute_batch_summaries.
+
+Usage:
+    python benchmarks/bench_batch_analytics.py [--users 2000] [--expenses 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(path, users, expenses, seed=42):
+    import sqlite3
+    from database.migrations import run_migrations
+    from expenses.expense_manager import EXPENSE_CATEGORIES
+
+    rng = random.Random(seed)
+    today = datetime.now()
+    connection = sqlite3.connect(path)
+    run_migrations(connection)
+    connection.executemany(
+        "INSERT INTO users (user_id, username, email, password_hash, salt) VALUES (?, ?, ?, 'x', 'x')",
+        [(u, f'user{u}', f'user{u}@example.com') for u in range(1, users + 1)]
+    )
+    rows = []
+    for u in range(1, users + 1):
+        for _ in range(expenses):
+            amount = round(rng.uniform(10, 5000), 2)
+            day = (today - timedelta(days=rng.randint(0, 120))).strftime('%Y-%m-%d')
+            rows.append((u, amount, amount, rng.choice(EXPENSE_CATEGORIES), day))
+    connection.executemany(
+        "INSERT INTO expenses (user_id, amount, base_amount, category, date) VALUES (?, ?, ?, ?, ?)", rows
+    )
+    connection.commit()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--expenses', type=int, default=200, help='Expenses per user')
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_PATH'] = path
+    os.environ['ANALYTICS_CACHE_ENABLED'] = 'false'
+    seed(path, args.users, args.expenses)
+
+    from analytics.data_analytics import get_monthly_summary, get_category_distribution, get_spending_statistics
+    from analytics.batch import compute_batch_summaries
+
+    started = time.perf_counter()
+    for user_id in range(1, args.users + 1):
+        get_monthly_summary(user_id)
+        get_category_distribution(user_id)
+        get_spending_statistics(user_id)
+    loop_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    compute_batch_summaries()
+    batch_seconds = time.perf_counter() - started
+
+    print(f"{args.users:,} users x {args.expenses} expenses")
+    print(f"per-user loop: {loop_seconds:8.2f}s")
+    print(f"batch:         {batch_seconds:8.2f}s  ({loop_seconds / batch_seconds:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: memory and groupby latency of expense DataFrames before and
+after compact dtypes (categorical category/currency, dropped unused
+columns)
+
+Usage:
+    python benchmarks/bench_dataframe_dtypes.py [--rows 1000000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics.data_analytics import clean_expense_data
+from expenses.expense_manager import EXPENSE_CATEGORIES
+
+
+def make_raw_frame(rows, seed=42):
+    """Synthetic expenses in the pre-optimization layout (object columns)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 2000, rows), unit='D')
+    amounts = rng.gamma(2.0, 500.0, rows).round(2)
+    return pd.DataFrame({
+        'expense_id': np.arange(1, rows + 1),
+        'user_id': np.ones(rows, dtype=np.int64),
+        'amount': amounts,
+        'base_amount': amounts,
+        'currency': rng.choice(['INR', 'USD', 'EUR', 'GBP'], rows, p=[0.85, 0.1, 0.03, 0.02]).astype(object),
+        'category': rng.choice(EXPENSE_CATEGORIES, rows).astype(object),
+        'date': dates.strftime('%Y-%m-%d').astype(object),
+        'description': np.array(['card payment'] * rows, dtype=object),
+        'created_at': np.array(['2024-01-01 00:00:00'] * rows, dtype=object),
+    })
+
+
+def legacy_clean(df):
+    """The previous clean_expense_data: object columns, nothing dropped"""
+    df['date'] = pd.to_datetime(df['date'])
+    df['category'] = df['category'].fillna('Other')
+    df['description'] = df['description'].fillna('')
+    df['amount'] = pd.to_numeric(df['amount'], errors='coerce').fillna(0)
+    df['base_amount'] = pd.to_numeric(df['base_amount'], errors='coerce').fillna(0)
+    return df
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def run(rows, repeat):
+    raw = make_raw_frame(rows)
+    before = legacy_clean(raw.copy())
+    after = clean_expense_data(raw.copy())
+
+    results = []
+    for label, df in (('before', before), ('after', after)):
+        results.append({
+            'layout': label,
+            'memory_mb': df.memory_usage(deep=True).sum() / 1e6,
+            'groupby_category_ms': best_of(repeat, lambda: df.groupby('category', observed=True)['base_amount'].sum()),
+            'filter_category_ms': best_of(repeat, lambda: df[df['category'] == 'Groceries']),
+            'groupby_currency_ms': best_of(repeat, lambda: df.groupby('currency', observed=True)['amount'].sum()),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat)
+
+    print(f"{args.rows:,} rows, best of {args.repeat}")
+    print(f"{'layout':<8} {'memory MB':>10} {'groupby cat ms':>15} {'filter cat ms':>14} {'groupby cur ms':>15}")
+    for r in results:
+        print(f"{r['layout']:<8} {r['memory_mb']:>10.1f} {r['groupby_category_ms']:>15.1f} "
+              f"{r['filter_category_ms']:>14.1f} {r['groupby_currency_ms']:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark: expense DataFrame loads from SQLite vs columnar snapshots
+
+Seeds a throwaway database with one user holding a large history, then
+times load_expense_dataframe over the full history and over a 90-day
+window with snapshots disabled and enabled (both file formats where
+pyarrow is installed).
+
+Usage:
+    python benchmarks/bench_snapshot_loads.py [--expenses 500000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def seed(path, expenses, seed=42):
+    import sqlite3
+    from database.migrations import run_migrations
+    from expenses.expense_manager import EXPENSE_CATEGORIES
+
+    rng = random.Random(seed)
+    today = datetime.now()
+    connection = sqlite3.connect(path)
+    run_migrations(connection)
+    connection.execute("INSERT INTO users (user_id, username, email, password_hash, salt) "
+                       "VALUES (1, 'bench', 'bench@example.com', 'x', 'x')")
+    rows = []
+    for _ in range(expenses):
+        amount = round(rng.uniform(10, 5000), 2)
+        day = (today - timedelta(days=rng.randint(0, 3650))).strftime('%Y-%m-%d')
+        rows.append((1, amount, amount, rng.choice(EXPENSE_CATEGORIES), day, 'card payment'))
+    connection.executemany(
+        "INSERT INTO expenses (user_id, amount, base_amount, category, date, description) "
+        "VALUES (?, ?, ?, ?, ?, ?)", rows
+    )
+    connection.commit()
+    connection.close()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--expenses', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['ANALYTICS_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+    os.environ['QUERY_INSTRUMENTATION'] = 'false'
+    seed(os.environ['DATABASE_PATH'], args.expenses)
+
+    from config import Config
+    from analytics import snapshots
+    from analytics.data_analytics import load_expense_dataframe
+
+    start_90 = datetime.now() - timedelta(days=90)
+    layouts = [('sqlite', False, None), ('numpy', True, 'numpy')]
+    if snapshots.pa is not None:
+        layouts.append(('arrow', True, 'arrow'))
+
+    print(f"{args.expenses:,} expenses, best of {args.repeat}")
+    print(f"{'source':<8} {'full ms':>10} {'90 days ms':>11} {'first build ms':>15}")
+    for label, enabled, fmt in layouts:
+        Config.ANALYTICS_SNAPSHOTS_ENABLED = enabled
+        build = 0.0
+        if enabled:
+            Config.ANALYTICS_SNAPSHOT_FORMAT = fmt
+            snapshots.snapshot_cache.clear()
+            build = best_of(1, lambda: snapshots.advance_snapshot(1))
+        full = best_of(args.repeat, lambda: load_expense_dataframe(1))
+        recent = best_of(args.repeat, lambda: load_expense_dataframe(1, start_90, datetime.now()))
+        print(f"{label:<8} {full:>10.1f} {recent:>11.1f} {build:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
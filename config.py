@@ -15,10 +15,86 @@ class Config:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     DATABASE_PATH = os.environ.get('DATABASE_PATH') or os.path.join(BASE_DIR, 'finance_tracker.db')
     
+    # SQLite connection tuning
+    SQLITE_TIMEOUT = float(os.environ.get('SQLITE_TIMEOUT', 30))  # seconds to wait on a locked database
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # negative = KiB, positive = pages
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))  # bytes
+    SQLITE_STATEMENT_CACHE = int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))  # prepared statements per connection
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))  # idle connections kept for reuse
+    
+    # Group-commit concurrent expense writes in one transaction
+    WRITE_BATCHING_ENABLED = os.environ.get('WRITE_BATCHING_ENABLED', 'false').lower() == 'true'
+    WRITE_BATCH_WINDOW_MS = float(os.environ.get('WRITE_BATCH_WINDOW_MS', 5))
+    WRITE_BATCH_MAX_SIZE = int(os.environ.get('WRITE_BATCH_MAX_SIZE', 100))
+    
+    # Query instrumentation
+    QUERY_INSTRUMENTATION = os.environ.get('QUERY_INSTRUMENTATION', 'true').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_LOG_PATH = os.environ.get('SLOW_QUERY_LOG_PATH')  # None logs via the root logger only
+    REQUEST_QUERY_WARNING = int(os.environ.get('REQUEST_QUERY_WARNING', 20))  # warn when a request runs this many queries
+    
     # ExchangeRate-API settings
     EXCHANGE_API_KEY = os.environ.get('EXCHANGE_API_KEY') or 'your-api-key-here'
     EXCHANGE_API_URL = 'https://v6.exchangerate-api.com/v6/'
     
+    # Maximum rows accepted by one bulk expense import
+    BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', 5000))
+    
+    # Expense list pagination
+    EXPENSES_PAGE_SIZE = 50
+    EXPENSES_MAX_PAGE_SIZE = 200
+    
+    # Trailing days of expenses shared by all analytics calls in one request
+    ANALYTICS_CONTEXT_DAYS = 180
+    
+    # Aggregate histories above this many rows in streamed chunks
+    ANALYTICS_STREAMING_THRESHOLD = int(os.environ.get('ANALYTICS_STREAMING_THRESHOLD', 200000))
+    ANALYTICS_CHUNK_SIZE = int(os.environ.get('ANALYTICS_CHUNK_SIZE', 20000))
+    
+    # dtype for amount columns in analytics DataFrames ('float64' or 'float32')
+    ANALYTICS_FLOAT_DTYPE = os.environ.get('ANALYTICS_FLOAT_DTYPE', 'float64')
+    
+    # Per-process LRU cache of analytics results, invalidated by data version
+    ANALYTICS_CACHE_ENABLED = os.environ.get('ANALYTICS_CACHE_ENABLED', 'true').lower() == 'true'
+    ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 1024))
+    
+    # Memory-mapped per-user columnar expense snapshots ('auto', 'arrow' or 'numpy')
+    ANALYTICS_SNAPSHOTS_ENABLED = os.environ.get('ANALYTICS_SNAPSHOTS_ENABLED', 'false').lower() == 'true'
+    ANALYTICS_SNAPSHOT_DIR = os.environ.get('ANALYTICS_SNAPSHOT_DIR') or os.path.join(BASE_DIR, 'snapshots')
+    ANALYTICS_SNAPSHOT_FORMAT = os.environ.get('ANALYTICS_SNAPSHOT_FORMAT', 'auto')
+    ANALYTICS_SNAPSHOT_CACHE_SIZE = int(os.environ.get('ANALYTICS_SNAPSHOT_CACHE_SIZE', 64))
+    
+    # Fitted forecast models kept per process (shares ANALYTICS_CACHE_ENABLED)
+    FORECAST_MODEL_CACHE_SIZE = int(os.environ.get('FORECAST_MODEL_CACHE_SIZE', 512))
+    
+    # Forecast engine for users who have not chosen one ('linear' or 'holt_winters')
+    FORECAST_ENGINE = os.environ.get('FORECAST_ENGINE', 'linear')
+    # Holt-Winters smoothing factors for level, trend and monthly seasonality
+    FORECAST_SMOOTHING_ALPHA = float(os.environ.get('FORECAST_SMOOTHING_ALPHA', 0.4))
+    FORECAST_SMOOTHING_BETA = float(os.environ.get('FORECAST_SMOOTHING_BETA', 0.2))
+    FORECAST_SMOOTHING_GAMMA = float(os.environ.get('FORECAST_SMOOTHING_GAMMA', 0.3))
+    
+    # Background recomputation of stale rows in the predictions table
+    FORECAST_SCHEDULER_ENABLED = os.environ.get('FORECAST_SCHEDULER_ENABLED', 'false').lower() == 'true'
+    FORECAST_SCHEDULER_INTERVAL = float(os.environ.get('FORECAST_SCHEDULER_INTERVAL', 300))
+    FORECAST_SCHEDULER_BATCH_SIZE = int(os.environ.get('FORECAST_SCHEDULER_BATCH_SIZE', 100))
+    FORECAST_SCHEDULER_MIN_PAUSE = float(os.environ.get('FORECAST_SCHEDULER_MIN_PAUSE', 1))
+    
+    # Per-user month x weekday x category spending cubes kept in memory
+    SPENDING_CUBE_CACHE_SIZE = int(os.environ.get('SPENDING_CUBE_CACHE_SIZE', 256))
+    
+    # Per-user Holt-Winters forecast states kept in memory
+    SMOOTHING_STATE_CACHE_SIZE = int(os.environ.get('SMOOTHING_STATE_CACHE_SIZE', 256))
+    
+    # Per-user prefix-sum indexes over daily totals kept in memory
+    RANGE_INDEX_CACHE_SIZE = int(os.environ.get('RANGE_INDEX_CACHE_SIZE', 256))
+    # Delta log entries kept by `python -m database prune-deltas`
+    RANGE_DELTA_RETENTION = int(os.environ.get('RANGE_DELTA_RETENTION', 100000))
+    
+    # Expenses this many standard deviations above their category's mean are
+    # shown as unusual (flags are recorded from 2.0 up)
+    ANOMALY_ZSCORE = float(os.environ.get('ANOMALY_ZSCORE', 3.0))
+    
     # Default currency
     DEFAULT_CURRENCY = 'INR'
     
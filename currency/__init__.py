@@ -1,6 +1,7 @@
 from .converter import (
     fetch_exchange_rates,
     convert_currency,
+    convert_currency_batch,
     get_supported_currencies,
     get_exchange_rate
 )
@@ -105,6 +105,39 @@ def convert_currency(amount, from_currency, to_currency='INR'):
     return round(converted_amount, 2)
 
 
+def convert_currency_batch(items, to_currency='INR'):
+    """
+    Convert many amounts using a single rate lookup
+    
+    Args:
+        items: Iterable of (amount, from_currency) pairs
+        to_currency: Target currency code
+    
+    Returns:
+        List of converted amounts, in input order
+    """
+    items = list(items)
+    if all(from_currency == to_currency for _, from_currency in items):
+        return [amount for amount, _ in items]
+    
+    rates = fetch_exchange_rates('USD')
+    
+    if not rates:
+        return [amount for amount, _ in items]
+    
+    to_rate = rates.get(to_currency, 1)
+    converted = []
+    for amount, from_currency in items:
+        if from_currency == to_currency:
+            converted.append(amount)
+            continue
+        # Same arithmetic as convert_currency so single and bulk adds agree
+        amount_usd = amount / rates.get(from_currency, 1) if from_currency != 'USD' else amount
+        converted.append(round(amount_usd * to_rate, 2))
+    
+    return converted
+
+
 def get_supported_currencies():
     """
     Get list of supported currencies
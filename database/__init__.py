@@ -1 +1,14 @@
-from .connection import get_db_connection, execute_query, init_database
+from .connection import (
+    get_db_connection,
+    get_pooled_connection,
+    close_db_connection,
+    close_all_connections,
+    execute_query,
+    iter_query_columns,
+    execute_many,
+    execute_write,
+    get_write_batcher,
+    init_database,
+    init_app
+)
+from .migrations import run_migrations, get_schema_version, check_query_plans
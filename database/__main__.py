@@ -0,0 +1,119 @@
+"""
+Database maintenance commands
+
+Usage:
+    python -m database migrate            Apply pending schema migrations
+    python -m database check              Verify query plans and every trigger-maintained table
+    python -m database verify-rollups     Compare rollup tables with raw expenses
+    python -m database verify-deltas      Replay the daily delta log against rollups and expenses
+    python -m database verify-stats       Compare category statistics and anomaly flags with raw expenses
+    python -m database rebuild-rollups    Recompute rollup tables and category statistics from raw expenses
+    python -m database prune-deltas       Trim the daily delta log to RANGE_DELTA_RETENTION entries
+"""
+import sys
+from config import Config
+from database.connection import get_db_connection
+from database.migrations import run_migrations, get_schema_version, check_query_plans
+from database.rollups import rebuild_rollups, verify_rollups, verify_daily_deltas, prune_daily_deltas
+from database.anomalies import rebuild_category_stats, verify_category_stats
+
+
+def migrate(connection):
+    applied = run_migrations(connection)
+    print(f"Schema version {get_schema_version(connection)} (applied: {applied or 'none'})")
+    return 0
+
+
+def check(connection):
+    run_migrations(connection)
+    problems = check_query_plans(connection)
+    for problem in problems:
+        print(f"Bad query plan: {problem}")
+    if not problems:
+        print("All hot query plans use indexes without temp sorts.")
+
+    # Trigger-maintained tables must agree with a recomputation from expenses
+    failed = [command(connection) for command in (
+        verify_rollups_command, verify_deltas_command, verify_stats_command
+    )]
+    return 1 if problems or any(failed) else 0
+
+
+def verify_rollups_command(connection):
+    run_migrations(connection)
+    problems = verify_rollups(connection.cursor())
+    for problem in problems:
+        print(f"Rollup drift: {problem}")
+    if not problems:
+        print("Rollup tables match raw expenses.")
+    return 1 if problems else 0
+
+
+def verify_deltas_command(connection):
+    run_migrations(connection)
+    problems = verify_daily_deltas(connection.cursor())
+    for problem in problems:
+        print(f"Delta log drift: {problem}")
+    if not problems:
+        print("Delta log matches rollups and expenses.")
+    return 1 if problems else 0
+
+
+def verify_stats_command(connection):
+    run_migrations(connection)
+    problems = verify_category_stats(connection.cursor())
+    for problem in problems:
+        print(f"Category statistics drift: {problem}")
+    if not problems:
+        print("Category statistics and anomaly flags match raw expenses.")
+    return 1 if problems else 0
+
+
+def rebuild_rollups_command(connection):
+    run_migrations(connection)
+    cursor = connection.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    rebuild_rollups(cursor)
+    rebuild_category_stats(cursor)
+    connection.commit()
+    print("Rollup tables and category statistics rebuilt.")
+    return 0
+
+
+def prune_deltas_command(connection):
+    run_migrations(connection)
+    cursor = connection.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    removed = prune_daily_deltas(cursor, Config.RANGE_DELTA_RETENTION)
+    connection.commit()
+    print(f"Pruned {removed} delta log entries.")
+    return 0
+
+
+COMMANDS = {
+    'migrate': migrate,
+    'check': check,
+    'verify-rollups': verify_rollups_command,
+    'verify-deltas': verify_deltas_command,
+    'verify-stats': verify_stats_command,
+    'rebuild-rollups': rebuild_rollups_command,
+    'prune-deltas': prune_deltas_command,
+}
+
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in COMMANDS:
+        print(__doc__.strip())
+        return 2
+
+    connection = get_db_connection()
+    if not connection:
+        return 1
+    try:
+        return COMMANDS[argv[0]](connection)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
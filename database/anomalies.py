@@ -0,0 +1,197 @@
+"""
+Streaming per-category expense statistics and anomaly flags
+
+expense_category_stats holds each user's running count, mean and sum of
+squared deviations (Welford's M2) of base_amount per category. Triggers
+on the expenses table update it in O(1) per insert, update and delete:
+an insert folds the amount in, a delete removes it with the inverse
+update.
+
+Before an amount is folded in, the same trigger scores it against the
+category's statistics without it. Expenses at least ANOMALY_MIN_ZSCORE
+standard deviations above the mean, in a category with at least
+ANOMALY_MIN_COUNT earlier expenses, are recorded in expense_anomalies
+with the baseline they were judged against.
+"""
+
+
+# Statistics closer than this (relative to their size) are considered equal when verifying
+STATS_TOLERANCE = 1e-6
+
+# Categories need this many earlier expenses before anything is flagged
+ANOMALY_MIN_COUNT = 5
+
+# Lowest z-score recorded; readers can apply a stricter threshold
+ANOMALY_MIN_ZSCORE = 2.0
+
+STATS_TABLE = 'expense_category_stats'
+ANOMALY_TABLE = 'expense_anomalies'
+
+
+def _stats_add(row):
+    return f"""
+        INSERT INTO {STATS_TABLE} (user_id, category, count, mean, m2)
+        VALUES ({row}.user_id, {row}.category, 1, {row}.base_amount, 0)
+        ON CONFLICT (user_id, category) DO UPDATE SET
+            count = count + 1,
+            mean = mean + (excluded.mean - mean) / (count + 1),
+            m2 = m2 + (excluded.mean - mean) * (excluded.mean - mean) * count / (count + 1);
+    """
+
+
+def _stats_remove(row):
+    match = f"user_id = {row}.user_id AND category = {row}.category"
+    x = f"{row}.base_amount"
+    return f"""
+        UPDATE {STATS_TABLE} SET
+            count = count - 1,
+            mean = CASE WHEN count > 1 THEN (count * mean - {x}) / (count - 1) ELSE 0 END,
+            m2 = CASE WHEN count > 1
+                      THEN MAX(0, m2 - ({x} - mean) * ({x} - mean) * count / (count - 1))
+                      ELSE 0 END
+        WHERE {match};
+        DELETE FROM {STATS_TABLE} WHERE {match} AND count <= 0;
+    """
+
+
+def _score(row):
+    std = "sqrt(m2 / (count - 1))"
+    return f"""
+        INSERT OR REPLACE INTO {ANOMALY_TABLE}
+            (expense_id, user_id, category, amount, baseline_mean, baseline_std, zscore)
+        SELECT {row}.expense_id, {row}.user_id, {row}.category, {row}.base_amount,
+               mean, {std}, ({row}.base_amount - mean) / {std}
+        FROM {STATS_TABLE}
+        WHERE user_id = {row}.user_id AND category = {row}.category
+          AND count >= {ANOMALY_MIN_COUNT} AND m2 > 0
+          AND {row}.base_amount - mean >= {ANOMALY_MIN_ZSCORE} * {std};
+    """
+
+
+def anomaly_schema_statements():
+    """SQL creating the statistics and anomaly tables and their triggers"""
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            PRIMARY KEY (user_id, category)
+        ) WITHOUT ROWID
+        """,
+        f"""
+        CREATE TABLE IF NOT EXISTS {ANOMALY_TABLE} (
+            expense_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            baseline_mean REAL NOT NULL,
+            baseline_std REAL NOT NULL,
+            zscore REAL NOT NULL,
+            flagged_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{ANOMALY_TABLE}_user ON {ANOMALY_TABLE}(user_id, expense_id)",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_anomaly_insert
+        AFTER INSERT ON expenses
+        BEGIN {_score('NEW')} {_stats_add('NEW')} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_anomaly_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            {_stats_remove('OLD')}
+            DELETE FROM {ANOMALY_TABLE} WHERE expense_id = OLD.expense_id;
+        END
+        """,
+        # The changed expense is rescored against its category without it
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_anomaly_update
+        AFTER UPDATE OF user_id, base_amount, category ON expenses
+        BEGIN
+            {_stats_remove('OLD')}
+            DELETE FROM {ANOMALY_TABLE} WHERE expense_id = OLD.expense_id;
+            {_score('NEW')}
+            {_stats_add('NEW')}
+        END
+        """,
+    ]
+
+
+def rebuild_category_stats(cursor, user_id=None):
+    """
+    Recompute category statistics from the raw expenses table
+
+    Existing expenses are not scored: there is no record of the
+    statistics each was added against.
+
+    Args:
+        cursor: SQLite cursor (the caller owns the transaction)
+        user_id: Optional user to rebuild (default: everyone)
+    """
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    cursor.execute(f"DELETE FROM {STATS_TABLE} {where}", params)
+    cursor.execute(f"""
+        INSERT INTO {STATS_TABLE} (user_id, category, count, mean, m2)
+        SELECT e.user_id, e.category, COUNT(*), g.mean,
+               SUM((e.base_amount - g.mean) * (e.base_amount - g.mean))
+        FROM expenses e
+        JOIN (SELECT user_id, category, AVG(base_amount) AS mean
+              FROM expenses {where} GROUP BY user_id, category) g
+          ON g.user_id = e.user_id AND g.category = e.category
+        GROUP BY e.user_id, e.category
+    """, params)
+
+
+def verify_category_stats(cursor, user_id=None):
+    """
+    Compare category statistics and anomaly flags against the expenses table
+
+    Args:
+        cursor: SQLite cursor
+        user_id: Optional user to verify (default: everyone)
+
+    Returns:
+        List of mismatch descriptions (empty if consistent)
+    """
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    problems = []
+
+    expected = {}
+    for row in cursor.execute(f"SELECT user_id, category, base_amount FROM expenses {where}", params):
+        expected.setdefault((row[0], row[1]), []).append(row[2])
+    actual = {
+        (row[0], row[1]): row[2:]
+        for row in cursor.execute(f"SELECT user_id, category, count, mean, m2 FROM {STATS_TABLE} {where}", params)
+    }
+
+    def close(a, b):
+        return abs(a - b) <= STATS_TOLERANCE * max(1.0, abs(a), abs(b))
+
+    for group in sorted(set(expected) | set(actual), key=str):
+        amounts = expected.get(group, [])
+        mean = sum(amounts) / len(amounts) if amounts else 0.0
+        m2 = sum((x - mean) ** 2 for x in amounts)
+        count, got_mean, got_m2 = actual.get(group, (0, 0.0, 0.0))
+        if count != len(amounts) or not close(mean, got_mean) or not close(m2, got_m2):
+            problems.append(f"{STATS_TABLE} {group}: expected count={len(amounts)} mean={mean} m2={m2}, "
+                            f"found count={count} mean={got_mean} m2={got_m2}")
+
+    # Flags are dropped on delete and rescored on update, so each must match its expense
+    for row in cursor.execute(f"""
+        SELECT a.expense_id, a.user_id, a.category, a.amount, e.user_id, e.category, e.base_amount
+        FROM {ANOMALY_TABLE} a LEFT JOIN expenses e ON e.expense_id = a.expense_id
+        {where.replace('user_id', 'a.user_id')}
+    """, params):
+        if row[4] is None:
+            problems.append(f"{ANOMALY_TABLE} flags deleted expense {row[0]}")
+        elif row[1:3] != row[4:6] or abs(row[3] - row[6]) > STATS_TOLERANCE * max(1.0, abs(row[6])):
+            problems.append(f"{ANOMALY_TABLE} expense {row[0]} flagged as {row[1:4]}, now {row[4:]}")
+
+    return problems
@@ -3,24 +3,112 @@ Database connection module for SQLite
 """
 import sqlite3
 import os
+import queue
+import threading
+import time
+import atexit
 from config import Config
+from .migrations import run_migrations
+from . import instrumentation
+from .instrumentation import QueryTimer
+
+
+# Connection pool state: each thread holds at most one connection at a time,
+# idle connections are parked in _idle_connections for reuse
+_local = threading.local()
+_idle_connections = []
+_pool_lock = threading.Lock()
+
+
+def _configure_connection(connection):
+    """Apply row factory and performance pragmas to a new connection"""
+    connection.row_factory = sqlite3.Row  # Enable dict-like access
+    # Enable foreign key support
+    connection.execute("PRAGMA foreign_keys = ON")
+    # WAL lets readers proceed while a writer holds the lock
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(f"PRAGMA cache_size = {int(Config.SQLITE_CACHE_SIZE)}")
+    connection.execute(f"PRAGMA mmap_size = {int(Config.SQLITE_MMAP_SIZE)}")
+    connection.execute("PRAGMA temp_store = MEMORY")
 
 
 def get_db_connection():
     """
-    Create and return a SQLite database connection
+    Create and return a new SQLite database connection
     """
     try:
-        connection = sqlite3.connect(Config.DATABASE_PATH)
-        connection.row_factory = sqlite3.Row  # Enable dict-like access
-        # Enable foreign key support
-        connection.execute("PRAGMA foreign_keys = ON")
+        connection = sqlite3.connect(
+            Config.DATABASE_PATH,
+            timeout=Config.SQLITE_TIMEOUT,
+            cached_statements=Config.SQLITE_STATEMENT_CACHE,
+            check_same_thread=False  # Pooled connections may move between threads
+        )
+        _configure_connection(connection)
         return connection
     except sqlite3.Error as e:
         print(f"Error connecting to SQLite: {e}")
         return None
 
 
+def get_pooled_connection():
+    """
+    Return the connection bound to the current thread, reusing an idle
+    pooled connection or opening a new one if needed
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is not None:
+        return connection
+    
+    with _pool_lock:
+        if _idle_connections:
+            connection = _idle_connections.pop()
+    
+    if connection is None:
+        connection = get_db_connection()
+    
+    _local.connection = connection
+    return connection
+
+
+def close_db_connection(exception=None):
+    """
+    Release the current thread's connection back to the pool.
+    Registered as a Flask app-context teardown hook by init_app().
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        return
+    _local.connection = None
+    
+    try:
+        if connection.in_transaction:
+            connection.rollback()
+    except sqlite3.Error:
+        connection.close()
+        return
+    
+    with _pool_lock:
+        if len(_idle_connections) < Config.SQLITE_POOL_SIZE:
+            _idle_connections.append(connection)
+            return
+    connection.close()
+
+
+def close_all_connections():
+    """Close every idle pooled connection (e.g. on shutdown)"""
+    close_db_connection()
+    with _pool_lock:
+        while _idle_connections:
+            _idle_connections.pop().close()
+
+
+def init_app(app):
+    """Register connection teardown and query instrumentation with a Flask app"""
+    app.teardown_appcontext(close_db_connection)
+    instrumentation.init_app(app)
+
+
 def dict_from_row(row):
     """Convert sqlite3.Row to dictionary"""
     if row is None:
@@ -28,7 +116,15 @@ def dict_from_row(row):
     return dict(row)
 
 
-def execute_query(query, params=None, fetch=False, fetch_one=False):
+def columns_from_rows(description, rows):
+    """Transpose plain row tuples into a dict of column name -> list"""
+    names = [column[0] for column in description]
+    if not rows:
+        return {name: [] for name in names}
+    return {name: list(values) for name, values in zip(names, zip(*rows))}
+
+
+def execute_query(query, params=None, fetch=False, fetch_one=False, fetch_columns=False):
     """
     Execute a query and optionally fetch results
     
@@ -37,6 +133,8 @@ def execute_query(query, params=None, fetch=False, fetch_one=False):
         params: Query parameters (tuple)
         fetch: If True, fetch all results
         fetch_one: If True, fetch one result
+        fetch_columns: If True, fetch all results as a dict of
+                       column name -> list of values (no per-row dicts)
     
     Returns:
         Query results or last row id for INSERT
@@ -44,7 +142,7 @@ def execute_query(query, params=None, fetch=False, fetch_one=False):
     # Convert MySQL-style %s placeholders to SQLite ? placeholders
     query = query.replace('%s', '?')
     
-    connection = get_db_connection()
+    connection = get_pooled_connection()
     if not connection:
         return None
     
@@ -52,74 +150,286 @@ def execute_query(query, params=None, fetch=False, fetch_one=False):
     result = None
     
     try:
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            rows = cursor.fetchall()
-            result = [dict_from_row(row) for row in rows]
-        elif fetch_one:
-            result = dict_from_row(cursor.fetchone())
-        else:
-            connection.commit()
-            result = cursor.lastrowid
+        with QueryTimer(connection, query, params) as timer:
+            cursor.execute(query, params or ())
+            
+            if fetch_columns:
+                cursor.row_factory = None
+                rows = cursor.fetchall()
+                result = columns_from_rows(cursor.description, rows)
+                timer.rows = len(rows)
+            elif fetch:
+                rows = cursor.fetchall()
+                result = [dict_from_row(row) for row in rows]
+                timer.rows = len(result)
+            elif fetch_one:
+                result = dict_from_row(cursor.fetchone())
+                timer.rows = 1 if result else 0
+            else:
+                connection.commit()
+                result = cursor.lastrowid
+                timer.rows = cursor.rowcount
             
     except sqlite3.Error as e:
         print(f"Database error: {e}")
         connection.rollback()
     finally:
         cursor.close()
-        connection.close()
     
     return result
 
 
-def init_database():
+def iter_query_columns(query, params=None, chunk_size=10000):
     """
-    Initialize the database with required tables
+    Stream a query's results in fixed-size column batches
+    
+    Args:
+        query: SQL query string
+        params: Query parameters (tuple)
+        chunk_size: Rows per batch
+    
+    Yields:
+        Dict of column name -> list of values for each batch
     """
+    query = query.replace('%s', '?')
+    
+    connection = get_pooled_connection()
+    if not connection:
+        return
+    
+    cursor = connection.cursor()
+    cursor.row_factory = None
+    
     try:
-        connection = get_db_connection()
-        cursor = connection.cursor()
-        
-        # Create Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                email TEXT NOT NULL UNIQUE,
-                password_hash TEXT NOT NULL,
-                salt TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create Expenses table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS expenses (
-                expense_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                base_amount REAL NOT NULL,
-                currency TEXT DEFAULT 'INR',
-                category TEXT NOT NULL,
-                date DATE NOT NULL,
-                description TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            )
-        """)
+        # Fetches count toward the query's time and rows; the caller's work between batches does not
+        with QueryTimer(connection, query, params) as timer:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                timer.rows += len(rows)
+                with timer.paused():
+                    yield columns_from_rows(cursor.description, rows)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+    finally:
+        cursor.close()
+
+
+def execute_many(query, params_seq):
+    """
+    Execute one statement for many parameter sets in a single transaction
+    
+    Args:
+        query: SQL query string
+        params_seq: Iterable of query parameter tuples
+    
+    Returns:
+        Number of affected rows, or None if the transaction was rolled back
+    """
+    query = query.replace('%s', '?')
+    
+    connection = get_pooled_connection()
+    if not connection:
+        return None
+    
+    cursor = connection.cursor()
+    result = None
+    
+    try:
+        with QueryTimer(connection, query, None) as timer:
+            cursor.executemany(query, params_seq)
+            connection.commit()
+            result = cursor.rowcount
+            timer.rows = result
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        connection.rollback()
+    finally:
+        cursor.close()
+    
+    return result
+
+
+class _PendingWrite:
+    """A write statement waiting for its batch to commit"""
+    
+    def __init__(self, query, params):
+        self.query = query
+        self.params = params
+        self.result = None
+        self.done = threading.Event()
+
+
+class WriteBatcher:
+    """
+    Group-commit service for write statements
+    
+    Callers submit INSERT/UPDATE/DELETE statements from any thread; a
+    background writer collects them for up to window_ms, runs them in one
+    transaction (each inside its own savepoint so one failure does not
+    abort the others) and then wakes every caller with its own result.
+    """
+    
+    def __init__(self, window_ms=5, max_batch=100):
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+    
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='sqlite-write-batcher', daemon=True)
+                self._thread.start()
+    
+    def stop(self):
+        """Flush pending writes and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            self._stopping = True
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+    
+    def submit(self, query, params=None):
+        """
+        Queue a write and wait for its batch to commit
         
-        # Create indexes for better query performance
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_expenses ON expenses(user_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expense_date ON expenses(date)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expense_category ON expenses(category)")
+        Returns:
+            lastrowid of the statement, or None if it failed
+        """
+        self.start()
+        pending = _PendingWrite(query.replace('%s', '?'), params or ())
+        self._queue.put(pending)
+        pending.done.wait()
+        return pending.result
+    
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Re-deliver the stop signal after this batch
+                break
+            batch.append(item)
+        return batch
+    
+    def _run(self):
+        connection = get_db_connection()
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    if self._stopping:
+                        self._drain(connection)
+                        return
+                    continue
+                self._commit(connection, self._collect(first))
+        finally:
+            if connection:
+                connection.close()
+    
+    def _drain(self, connection):
+        """Commit whatever was queued behind the stop signal"""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self._commit(connection, self._collect(item))
+    
+    def _commit(self, connection, batch):
+        results = [None] * len(batch)
+        if connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                for i, pending in enumerate(batch):
+                    cursor.execute("SAVEPOINT batched_write")
+                    try:
+                        cursor.execute(pending.query, pending.params)
+                        results[i] = cursor.lastrowid
+                        cursor.execute("RELEASE batched_write")
+                    except sqlite3.Error as e:
+                        print(f"Database error: {e}")
+                        cursor.execute("ROLLBACK TO batched_write")
+                        cursor.execute("RELEASE batched_write")
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"Database error: {e}")
+                connection.rollback()
+                results = [None] * len(batch)
+            finally:
+                cursor.close()
         
-        connection.commit()
+        for pending, result in zip(batch, results):
+            pending.result = result
+            pending.done.set()
+
+
+_write_batcher = None
+_write_batcher_lock = threading.Lock()
+
+
+def get_write_batcher():
+    """Return the process-wide WriteBatcher, creating it on first use"""
+    global _write_batcher
+    with _write_batcher_lock:
+        if _write_batcher is None:
+            _write_batcher = WriteBatcher(Config.WRITE_BATCH_WINDOW_MS, Config.WRITE_BATCH_MAX_SIZE)
+            atexit.register(_write_batcher.stop)
+        return _write_batcher
+
+
+def execute_write(query, params=None):
+    """
+    Execute a single write statement, group-committed with concurrent
+    writes when Config.WRITE_BATCHING_ENABLED is set
+    
+    Args:
+        query: SQL INSERT/UPDATE/DELETE string
+        params: Query parameters (tuple)
+    
+    Returns:
+        Last row id, or None on error (same as execute_query)
+    """
+    if not Config.WRITE_BATCHING_ENABLED:
+        return execute_query(query, params)
+    
+    with QueryTimer(None, query, params) as timer:
+        result = get_write_batcher().submit(query, params)
+        timer.rows = 0 if result is None else 1
+    return result
+
+
+def init_database():
+    """
+    Initialize the database by applying pending schema migrations
+    """
+    connection = get_db_connection()
+    if not connection:
+        return
+    
+    try:
+        applied = run_migrations(connection)
+        if applied:
+            print(f"Applied database migrations: {applied}")
         print("Database initialized successfully!")
         
     except sqlite3.Error as e:
         print(f"Error initializing database: {e}")
     finally:
-        if connection:
-            cursor.close()
-            connection.close()
+        connection.close()
@@ -1,5 +1,5 @@
 -- Finance Tracker Database Setup (SQLite)
--- The database is auto-created by the application
+-- The database is auto-created and migrated by the application
 -- This script can be run manually with: sqlite3 finance_tracker.db < db_setup.sql
 
 -- Users Table
@@ -26,7 +26,7 @@ CREATE TABLE IF NOT EXISTS expenses (
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
--- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_user_expenses ON expenses(user_id);
-CREATE INDEX IF NOT EXISTS idx_expense_date ON expenses(date);
-CREATE INDEX IF NOT EXISTS idx_expense_category ON expenses(category);
+-- Composite indexes for user + date range queries ordered by date
+-- (the application manages these through database/migrations.py)
+CREATE INDEX IF NOT EXISTS idx_expenses_user_date_id ON expenses(user_id, date, expense_id, category, base_amount);
+CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses(user_id, category, date);
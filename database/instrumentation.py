@@ -0,0 +1,210 @@
+"""
+Query instrumentation for SQLite
+
+Records latency, row counts and a normalized fingerprint for every
+statement run through execute_query, aggregates them per request and
+writes statements above Config.SLOW_QUERY_THRESHOLD_MS to the slow-query
+log together with their query plan.
+"""
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+
+
+slow_query_logger = logging.getLogger('finance_tracker.slow_queries')
+request_logger = logging.getLogger('finance_tracker.queries')
+
+_local = threading.local()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint_sql(query):
+    """
+    Normalize a SQL statement so that executions differing only in
+    literals or placeholder counts share one fingerprint
+
+    Args:
+        query: SQL query string
+
+    Returns:
+        Normalized query string
+    """
+    query = query.replace('%s', '?')
+    query = _STRING_LITERAL.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    query = _PLACEHOLDER_LIST.sub('(?+)', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+class RequestQueryStats:
+    """Query counters for a single request"""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total_ms = 0.0
+        self.rows = 0
+        self.by_fingerprint = {}  # fingerprint -> [count, total_ms, rows]
+
+    def record(self, fingerprint, elapsed_ms, rows):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.rows += rows
+        entry = self.by_fingerprint.setdefault(fingerprint, [0, 0.0, 0])
+        entry[0] += 1
+        entry[1] += elapsed_ms
+        entry[2] += rows
+
+    def repeated(self, min_count=2):
+        """Fingerprints executed at least min_count times, most frequent first"""
+        repeats = [(fp, entry) for fp, entry in self.by_fingerprint.items() if entry[0] >= min_count]
+        return sorted(repeats, key=lambda item: item[1][0], reverse=True)
+
+    def summary(self):
+        return {
+            'label': self.label,
+            'queries': self.count,
+            'query_ms': round(self.total_ms, 2),
+            'rows': self.rows,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'repeated': [
+                {'fingerprint': fp, 'count': entry[0], 'query_ms': round(entry[1], 2), 'rows': entry[2]}
+                for fp, entry in self.repeated()
+            ]
+        }
+
+
+def begin_request(label=None):
+    """Start collecting query stats for the current thread"""
+    _local.stats = RequestQueryStats(label)
+    return _local.stats
+
+
+def end_request():
+    """Stop collecting and return the current thread's stats (or None)"""
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    return stats
+
+
+def get_request_stats():
+    """Return the stats being collected for the current thread (or None)"""
+    return getattr(_local, 'stats', None)
+
+
+def _query_plan(connection, query, params):
+    """Best-effort EXPLAIN QUERY PLAN for read statements"""
+    if connection is None or not query.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return []
+    try:
+        rows = connection.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+        return [row[3] for row in rows]
+    except Exception:
+        return []
+
+
+def record_query(connection, query, params, elapsed_ms, rows):
+    """
+    Record one executed statement
+
+    Args:
+        connection: Connection the statement ran on (used for the plan)
+        query: SQL query string with ? placeholders
+        params: Query parameters
+        elapsed_ms: Execution time in milliseconds
+        rows: Rows returned or affected
+    """
+    if not Config.QUERY_INSTRUMENTATION:
+        return
+
+    fingerprint = fingerprint_sql(query)
+
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.record(fingerprint, elapsed_ms, rows)
+
+    if elapsed_ms >= Config.SLOW_QUERY_THRESHOLD_MS:
+        plan = _query_plan(connection, query, params)
+        slow_query_logger.warning(
+            "slow query %.1f ms, %d rows%s: %s | plan: %s",
+            elapsed_ms, rows,
+            f" [{stats.label}]" if stats is not None and stats.label else '',
+            fingerprint, '; '.join(plan) or 'n/a'
+        )
+
+
+class QueryTimer:
+    """Context manager timing a statement; set .rows before exiting"""
+
+    def __init__(self, connection, query, params):
+        self.connection = connection
+        self.query = query
+        self.params = params
+        self.rows = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A generator closed early still ran (and fetched) what it yielded
+        if exc_type is None or issubclass(exc_type, GeneratorExit):
+            elapsed_ms = (time.perf_counter() - self.started) * 1000
+            record_query(self.connection, self.query, self.params, elapsed_ms, self.rows)
+        return False
+
+    @contextmanager
+    def paused(self):
+        """Leave the time spent inside the block (e.g. a generator's consumer) out of the timing"""
+        paused_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.started += time.perf_counter() - paused_at
+
+
+def configure_slow_query_log():
+    """Attach a file handler to the slow-query logger if a path is configured"""
+    path = Config.SLOW_QUERY_LOG_PATH
+    if not path or any(getattr(h, 'baseFilename', None) == path for h in slow_query_logger.handlers):
+        return
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.WARNING)
+
+
+def init_app(app):
+    """Collect per-request query stats for a Flask app"""
+    from flask import request
+
+    configure_slow_query_log()
+
+    @app.before_request
+    def _begin_query_stats():
+        begin_request(f"{request.method} {request.path}")
+
+    @app.after_request
+    def _report_query_stats(response):
+        stats = end_request()
+        if stats is None:
+            return response
+
+        response.headers['X-Query-Count'] = str(stats.count)
+        response.headers['Server-Timing'] = f"db;dur={stats.total_ms:.1f}"
+
+        summary = stats.summary()
+        if stats.count >= Config.REQUEST_QUERY_WARNING:
+            request_logger.warning("%s ran %d queries (%.1f ms); repeated: %s",
+                                   stats.label, stats.count, stats.total_ms, summary['repeated'])
+        else:
+            request_logger.debug("%s ran %d queries (%.1f ms)", stats.label, stats.count, stats.total_ms)
+        return response
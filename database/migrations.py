@@ -0,0 +1,297 @@
+"""
+Versioned schema migrations for SQLite
+
+Each migration is applied once, in order, inside its own transaction and
+recorded in the schema_version table.
+"""
+import sqlite3
+from .rollups import (
+    rollup_schema_statements, rebuild_rollups, delta_schema_statements, delta_expense_id_statements
+)
+from .anomalies import anomaly_schema_statements, rebuild_category_stats
+
+
+# Ordered list of (version, description, steps). A step is either a SQL
+# string or a callable taking a cursor. Never edit an applied migration;
+# append a new one instead.
+MIGRATIONS = [
+    (1, 'Create users and expenses tables', [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            email TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+            expense_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            base_amount REAL NOT NULL,
+            currency TEXT DEFAULT 'INR',
+            category TEXT NOT NULL,
+            date DATE NOT NULL,
+            description TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (2, 'Replace single-column expense indexes with composite covering indexes', [
+        # Serves user_id + date range filters ordered by date, and covers
+        # the columns the analytics queries read
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses(user_id, date, category, base_amount)",
+        # Serves category-filtered listings ordered by date
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_category_date ON expenses(user_id, category, date)",
+        "DROP INDEX IF EXISTS idx_user_expenses",
+        "DROP INDEX IF EXISTS idx_expense_date",
+        "DROP INDEX IF EXISTS idx_expense_category",
+    ]),
+    (3, 'Add expense_id to the user/date index for keyset pagination', [
+        # (date, expense_id) is the pagination key; placing expense_id right
+        # after date lets ORDER BY date DESC, expense_id DESC use the index
+        "CREATE INDEX IF NOT EXISTS idx_expenses_user_date_id ON expenses(user_id, date, expense_id, category, base_amount)",
+        "DROP INDEX IF EXISTS idx_expenses_user_date",
+    ]),
+    (4, 'Add trigger-maintained daily and monthly expense rollups', [
+        *rollup_schema_statements(),
+        rebuild_rollups,  # Backfill from existing expenses
+    ]),
+    (5, 'Track a per-user data version bumped by every expense write', [
+        """
+        CREATE TABLE IF NOT EXISTS user_data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_version_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO user_data_versions (user_id, version) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_version_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            INSERT INTO user_data_versions (user_id, version) VALUES (OLD.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_version_update
+        AFTER UPDATE ON expenses
+        BEGIN
+            INSERT INTO user_data_versions (user_id, version) VALUES (NEW.user_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+            INSERT INTO user_data_versions (user_id, version)
+            SELECT OLD.user_id, 1 WHERE OLD.user_id != NEW.user_id
+            ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+        END
+        """,
+    ]),
+    (6, 'Log signed daily deltas for incrementally maintained range indexes', [
+        *delta_schema_statements(),
+    ]),
+    (7, 'Store per-user analytics summaries computed by the batch job', [
+        """
+        CREATE TABLE IF NOT EXISTS user_analytics_summaries (
+            user_id INTEGER PRIMARY KEY,
+            period TEXT NOT NULL,
+            monthly_summary TEXT NOT NULL,
+            category_distribution TEXT NOT NULL,
+            spending_statistics TEXT NOT NULL,
+            computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (8, 'Record the changed expense in each delta log entry', [
+        *delta_expense_id_statements(),
+    ]),
+    (9, 'Store precomputed forecasts tagged with their data version', [
+        """
+        CREATE TABLE IF NOT EXISTS predictions (
+            user_id INTEGER PRIMARY KEY,
+            data_version INTEGER NOT NULL,
+            computed_for DATE NOT NULL,
+            next_month TEXT NOT NULL,
+            forecast TEXT NOT NULL,
+            pattern TEXT NOT NULL,
+            computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (10, 'Add per-user forecast engine choice and online forecaster state', [
+        # NULL means Config.FORECAST_ENGINE
+        "ALTER TABLE users ADD COLUMN forecast_engine TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS forecast_states (
+            user_id INTEGER PRIMARY KEY,
+            month TEXT,
+            months INTEGER NOT NULL,
+            level REAL NOT NULL,
+            trend REAL NOT NULL,
+            seasonal TEXT NOT NULL,
+            mean REAL NOT NULL,
+            scored INTEGER NOT NULL,
+            score_mean REAL NOT NULL,
+            score_m2 REAL NOT NULL,
+            sse REAL NOT NULL,
+            seq INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+    (11, 'Add trigger-maintained per-category statistics and anomaly flags', [
+        *anomaly_schema_statements(),
+        rebuild_category_stats,  # Backfill statistics from existing expenses
+    ]),
+    (12, 'Store per-user month x weekday x category spending cubes', [
+        """
+        CREATE TABLE IF NOT EXISTS spending_cubes (
+            user_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            months TEXT NOT NULL,
+            categories TEXT NOT NULL,
+            sums BLOB NOT NULL,
+            counts BLOB NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+        """,
+    ]),
+]
+
+
+# Filter combinations of get_user_expenses checked by check_query_plans()
+HOT_QUERY_FILTERS = [
+    {},
+    {'limit': 5},
+    {'start_date': '2025-01-01', 'end_date': '2025-03-31'},
+    {'start_date': '2025-01-01'},
+    {'category': 'Groceries'},
+    {'start_date': '2025-01-01', 'end_date': '2025-03-31', 'category': 'Groceries'},
+    {'before': ('2025-02-01', 100), 'limit': 51},
+    {'before': ('2025-02-01', 100), 'category': 'Groceries', 'limit': 51},
+]
+
+
+def get_schema_version(connection):
+    """
+    Get the highest applied migration version
+
+    Args:
+        connection: SQLite connection
+
+    Returns:
+        Version number (0 for a fresh database)
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    row = connection.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(connection):
+    """
+    Apply all pending migrations in order
+
+    Args:
+        connection: SQLite connection
+
+    Returns:
+        List of applied migration versions
+    """
+    current = get_schema_version(connection)
+    applied = []
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute("BEGIN")
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description)
+            )
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        applied.append(version)
+
+    return applied
+
+
+def explain_query_plan(connection, query, params=()):
+    """
+    Return the EXPLAIN QUERY PLAN detail lines for a query
+
+    Args:
+        connection: SQLite connection
+        query: SQL query string (%s or ? placeholders)
+        params: Query parameters
+
+    Returns:
+        List of plan detail strings
+    """
+    query = query.replace('%s', '?')
+    rows = connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return [row[3] for row in rows]
+
+
+def check_query_plans(connection):
+    """
+    Verify that the hot get_user_expenses queries are index-driven
+
+    Flags any plan step that scans a whole table or index, or that needs
+    a temporary B-tree to sort.
+
+    Args:
+        connection: SQLite connection with the schema migrated
+
+    Returns:
+        List of problem descriptions (empty if all plans are good)
+    """
+    from expenses.expense_manager import build_user_expenses_query
+    from analytics.batch import ROLLUP_SCAN_QUERY, EXPENSE_SCAN_QUERY
+
+    problems = []
+    for filters in HOT_QUERY_FILTERS:
+        query, params = build_user_expenses_query(1, **filters)
+        for detail in explain_query_plan(connection, query, params):
+            if detail.startswith('SCAN') or 'TEMP B-TREE' in detail:
+                problems.append(f"{filters or 'no filters'}: {detail}")
+
+    # The batch scans visit every user on purpose; anything else they scan is a problem
+    for name, query in (('batch rollup scan', ROLLUP_SCAN_QUERY), ('batch expense scan', EXPENSE_SCAN_QUERY)):
+        for detail in explain_query_plan(connection, query, ('2025-01-01', '2025-03-31')):
+            if (detail.startswith('SCAN') and not detail.startswith('SCAN users')) or 'TEMP B-TREE' in detail:
+                problems.append(f"{name}: {detail}")
+
+    return problems
+
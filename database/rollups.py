@@ -0,0 +1,334 @@
+"""
+Expense rollup tables
+
+expense_daily_rollups and expense_monthly_rollups hold per-user,
+per-category totals and counts. Triggers on the expenses table keep them
+in step with every insert, update and delete inside the same transaction;
+rebuild_rollups() and verify_rollups() recover from and detect drift.
+
+expense_daily_deltas is an append-only log of the signed (day, category)
+changes the same writes make, tagged with the expense that changed, so
+indexes and snapshots built earlier can catch up by replaying only what
+changed since they were built.
+"""
+
+
+# (table, period key column, SQL expression deriving the key from expenses.date)
+ROLLUP_TABLES = [
+    ('expense_daily_rollups', 'day', 'date'),
+    ('expense_monthly_rollups', 'month', 'substr(date, 1, 7)'),
+]
+
+# Change log replayed by analytics.range_index
+DELTA_TABLE = 'expense_daily_deltas'
+
+# Totals closer than this are considered equal when verifying
+ROLLUP_TOLERANCE = 0.005
+
+
+def _trigger_add(table, key, expr, row):
+    expr = expr.replace('date', f'{row}.date')
+    return f"""
+        INSERT INTO {table} (user_id, {key}, category, total, count)
+        VALUES ({row}.user_id, {expr}, {row}.category, {row}.base_amount, 1)
+        ON CONFLICT (user_id, {key}, category)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+    """
+
+
+def _trigger_remove(table, key, expr, row):
+    expr = expr.replace('date', f'{row}.date')
+    match = f"user_id = {row}.user_id AND {key} = {expr} AND category = {row}.category"
+    return f"""
+        UPDATE {table} SET total = total - {row}.base_amount, count = count - 1 WHERE {match};
+        DELETE FROM {table} WHERE {match} AND count <= 0;
+    """
+
+
+def rollup_schema_statements():
+    """SQL creating the rollup tables and the triggers that maintain them"""
+    statements = []
+    for table, key, _ in ROLLUP_TABLES:
+        statements.append(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL,
+                {key} TEXT NOT NULL,
+                category TEXT NOT NULL,
+                total REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, {key}, category)
+            ) WITHOUT ROWID
+        """)
+
+    add = ''.join(_trigger_add(t, k, e, 'NEW') for t, k, e in ROLLUP_TABLES)
+    remove = ''.join(_trigger_remove(t, k, e, 'OLD') for t, k, e in ROLLUP_TABLES)
+
+    statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_insert
+        AFTER INSERT ON expenses
+        BEGIN {add} END
+    """)
+    statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_delete
+        AFTER DELETE ON expenses
+        BEGIN {remove} END
+    """)
+    statements.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_rollup_update
+        AFTER UPDATE OF user_id, base_amount, category, date ON expenses
+        BEGIN {remove} {add} END
+    """)
+    return statements
+
+
+def rebuild_rollups(cursor, user_id=None):
+    """
+    Recompute rollup rows from the raw expenses table
+
+    Args:
+        cursor: SQLite cursor (the caller owns the transaction)
+        user_id: Optional user to rebuild (default: everyone)
+    """
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    for table, key, expr in ROLLUP_TABLES:
+        cursor.execute(f"DELETE FROM {table} {where}", params)
+        cursor.execute(f"""
+            INSERT INTO {table} (user_id, {key}, category, total, count)
+            SELECT user_id, {expr}, category, SUM(base_amount), COUNT(*)
+            FROM expenses {where}
+            GROUP BY user_id, {expr}, category
+        """, params)
+
+
+def verify_rollups(cursor, user_id=None):
+    """
+    Compare rollup rows against totals recomputed from expenses
+
+    Args:
+        cursor: SQLite cursor
+        user_id: Optional user to verify (default: everyone)
+
+    Returns:
+        List of mismatch descriptions (empty if consistent)
+    """
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    problems = []
+
+    for table, key, expr in ROLLUP_TABLES:
+        expected = {
+            (row[0], row[1], row[2]): (row[3], row[4])
+            for row in cursor.execute(f"""
+                SELECT user_id, {expr}, category, SUM(base_amount), COUNT(*)
+                FROM expenses {where}
+                GROUP BY user_id, {expr}, category
+            """, params)
+        }
+        actual = {
+            (row[0], row[1], row[2]): (row[3], row[4])
+            for row in cursor.execute(
+                f"SELECT user_id, {key}, category, total, count FROM {table} {where}", params
+            )
+        }
+
+        for group in sorted(set(expected) | set(actual), key=str):
+            want = expected.get(group, (0, 0))
+            got = actual.get(group, (0, 0))
+            if want[1] != got[1] or abs(want[0] - got[0]) > ROLLUP_TOLERANCE:
+                problems.append(f"{table} {group}: expected total={want[0]} count={want[1]}, "
+                                f"found total={got[0]} count={got[1]}")
+
+    return problems
+
+
+def _delta_insert(row, sign, with_expense_id=False):
+    if with_expense_id:
+        return f"""
+            INSERT INTO {DELTA_TABLE} (user_id, day, category, total, count, expense_id)
+            VALUES ({row}.user_id, {row}.date, {row}.category, {sign}{row}.base_amount, {sign}1, {row}.expense_id);
+        """
+    return f"""
+        INSERT INTO {DELTA_TABLE} (user_id, day, category, total, count)
+        VALUES ({row}.user_id, {row}.date, {row}.category, {sign}{row}.base_amount, {sign}1);
+    """
+
+
+def delta_schema_statements():
+    """SQL creating the daily delta log, its prune watermark and triggers"""
+    return [
+        f"""
+        CREATE TABLE IF NOT EXISTS {DELTA_TABLE} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{DELTA_TABLE}_user_seq ON {DELTA_TABLE}(user_id, seq)",
+        # Highest seq removed by prune_daily_deltas(); readers that last saw
+        # an older seq have missed changes and must rebuild
+        """
+        CREATE TABLE IF NOT EXISTS expense_delta_watermark (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            pruned_through INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT OR IGNORE INTO expense_delta_watermark (id, pruned_through) VALUES (1, 0)",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_delta_insert
+        AFTER INSERT ON expenses
+        BEGIN {_delta_insert('NEW', '')} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_delta_delete
+        AFTER DELETE ON expenses
+        BEGIN {_delta_insert('OLD', '-')} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_delta_update
+        AFTER UPDATE OF user_id, base_amount, category, date ON expenses
+        BEGIN {_delta_insert('OLD', '-')} {_delta_insert('NEW', '')} END
+        """,
+    ]
+
+
+def delta_expense_id_statements():
+    """SQL recording the changed expense_id in every delta log entry"""
+    return [
+        f"ALTER TABLE {DELTA_TABLE} ADD COLUMN expense_id INTEGER",
+        "DROP TRIGGER IF EXISTS trg_expenses_delta_insert",
+        "DROP TRIGGER IF EXISTS trg_expenses_delta_delete",
+        "DROP TRIGGER IF EXISTS trg_expenses_delta_update",
+        f"""
+        CREATE TRIGGER trg_expenses_delta_insert
+        AFTER INSERT ON expenses
+        BEGIN {_delta_insert('NEW', '', True)} END
+        """,
+        f"""
+        CREATE TRIGGER trg_expenses_delta_delete
+        AFTER DELETE ON expenses
+        BEGIN {_delta_insert('OLD', '-', True)} END
+        """,
+        # Unlike the rollups, snapshots also hold amount, currency and
+        # description, so any column change is logged
+        f"""
+        CREATE TRIGGER trg_expenses_delta_update
+        AFTER UPDATE ON expenses
+        BEGIN {_delta_insert('OLD', '-', True)} {_delta_insert('NEW', '', True)} END
+        """,
+    ]
+
+
+def verify_daily_deltas(cursor, user_id=None):
+    """
+    Check the delta log against the rollups and the expenses table
+
+    - Entries at or below the prune watermark must be gone.
+    - If nothing was pruned, replaying the whole log onto the expenses
+      it never touched must reproduce expense_daily_rollups, which is
+      what incremental readers rely on.
+    - The newest entry for each logged expense must describe it as it
+      is now: an addition matching its row, or a removal once deleted.
+
+    Args:
+        cursor: SQLite cursor
+        user_id: Optional user to verify (default: everyone)
+
+    Returns:
+        List of mismatch descriptions (empty if consistent)
+    """
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    problems = []
+
+    pruned_through = cursor.execute("SELECT pruned_through FROM expense_delta_watermark WHERE id = 1").fetchone()[0]
+    stale = cursor.execute(f"SELECT COUNT(*) FROM {DELTA_TABLE} WHERE seq <= ?", (pruned_through,)).fetchone()[0]
+    if stale:
+        problems.append(f"{stale} entries at or below the prune watermark {pruned_through}")
+
+    entries = cursor.execute(f"""
+        SELECT expense_id, user_id, day, category, total, count FROM {DELTA_TABLE} {where} ORDER BY seq
+    """, params).fetchall()
+
+    # Expenses added before the log existed have no entries until they
+    # change, when their first entry removes the old row; those rows,
+    # plus every untouched expense, are the base the log replays onto
+    if pruned_through == 0 and all(entry[0] is not None for entry in entries):
+        replayed = {}
+
+        def add(group, total, count):
+            old_total, old_count = replayed.get(group, (0, 0))
+            replayed[group] = (old_total + total, old_count + count)
+
+        first = {}
+        for entry in entries:
+            first.setdefault(entry[0], entry)
+            add(entry[1:4], entry[4], entry[5])
+        for entry in first.values():
+            if entry[5] < 0:
+                add(entry[1:4], -entry[4], -entry[5])
+        # Expense IDs only grow, so anything newer than the first logged insert was added since
+        first_insert = min((entry[0] for entry in first.values() if entry[5] > 0), default=None)
+        for row in cursor.execute(f"SELECT expense_id, user_id, date, category, base_amount FROM expenses {where}", params):
+            if row[0] not in first:
+                add(tuple(row[1:4]), row[4], 1)
+                if first_insert is not None and row[0] > first_insert:
+                    problems.append(f"expense {row[0]} was added after {DELTA_TABLE} started but has no entries")
+
+        rollups = {
+            (row[0], row[1], row[2]): (row[3], row[4])
+            for row in cursor.execute(
+                f"SELECT user_id, day, category, total, count FROM expense_daily_rollups {where}", params
+            )
+        }
+        for group in sorted(set(replayed) | set(rollups), key=str):
+            want = rollups.get(group, (0, 0))
+            got = replayed.get(group, (0, 0))
+            if want[1] != got[1] or abs(want[0] - got[0]) > ROLLUP_TOLERANCE:
+                problems.append(f"replayed {DELTA_TABLE} {group}: expected total={want[0]} count={want[1]}, "
+                                f"found total={got[0]} count={got[1]}")
+
+    latest = cursor.execute(f"""
+        SELECT d.expense_id, d.user_id, d.day, d.category, d.total, d.count,
+               e.expense_id, e.user_id, e.date, e.category, e.base_amount
+        FROM {DELTA_TABLE} d
+        JOIN (SELECT expense_id, MAX(seq) AS seq FROM {DELTA_TABLE}
+              WHERE expense_id IS NOT NULL GROUP BY expense_id) last ON last.seq = d.seq
+        LEFT JOIN expenses e ON e.expense_id = d.expense_id
+        {where.replace('user_id', 'd.user_id')}
+    """, params).fetchall()
+    for row in latest:
+        logged, current = row[1:6], row[6:]
+        if current[0] is None:
+            if logged[4] > 0:
+                problems.append(f"expense {row[0]} was deleted but its last delta adds {logged}")
+        elif logged[4] < 0 or logged[:3] != current[1:4] or abs(logged[3] - current[4]) > ROLLUP_TOLERANCE:
+            problems.append(f"expense {row[0]} is {current[1:]} but its last delta is {logged}")
+
+    return problems
+
+
+def prune_daily_deltas(cursor, keep):
+    """
+    Drop all but the newest delta log entries
+
+    Args:
+        cursor: SQLite cursor (the caller owns the transaction)
+        keep: Number of most recent entries to keep
+
+    Returns:
+        Number of entries removed
+    """
+    through = cursor.execute(f"SELECT COALESCE(MAX(seq), 0) - ? FROM {DELTA_TABLE}", (keep,)).fetchone()[0]
+    if through <= 0:
+        return 0
+    cursor.execute(f"DELETE FROM {DELTA_TABLE} WHERE seq <= ?", (through,))
+    removed = cursor.rowcount
+    cursor.execute("""
+        UPDATE expense_delta_watermark SET pruned_through = MAX(pruned_through, ?) WHERE id = 1
+    """, (through,))
+    return removed
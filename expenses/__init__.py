@@ -1,9 +1,23 @@
 from .expense_manager import (
     add_expense,
+    add_expenses_bulk,
+    validate_expense_row,
     get_expense,
     get_user_expenses,
+    build_user_expenses_query,
+    get_user_expenses_page,
+    get_user_expenses_summary,
+    encode_page_cursor,
+    decode_page_cursor,
+    to_start_day,
+    to_end_day,
+    get_user_expense_columns,
+    iter_user_expense_chunks,
     update_expense,
     delete_expense,
     get_categories,
-    EXPENSE_CATEGORIES
+    get_user_data_version,
+    EXPENSE_CATEGORIES,
+    EXPENSE_COLUMNS
 )
+from .anomalies import get_anomalies, get_expense_anomaly
@@ -0,0 +1,70 @@
+"""
+Unusual expense lookups
+
+Expenses are scored as they are written by triggers on the expenses
+table (see database.anomalies); these functions only read the flags.
+"""
+from config import Config
+from database.connection import execute_query
+
+
+def _anomaly_from_row(row):
+    return {
+        'expense_id': row['expense_id'],
+        'date': row['date'],
+        'category': row['category'],
+        'description': row['description'],
+        'amount': row['amount'],
+        'typical_amount': round(row['baseline_mean'], 2),
+        'times_typical': round(row['amount'] / row['baseline_mean'], 1) if row['baseline_mean'] else None,
+        'zscore': round(row['zscore'], 2)
+    }
+
+
+def get_anomalies(user_id, limit=20, min_zscore=None):
+    """
+    Get a user's most recently added unusual expenses
+
+    Args:
+        user_id: ID of the user
+        limit: Maximum number of expenses to return
+        min_zscore: Standard deviations above the category mean an expense
+                    must be (default: Config.ANOMALY_ZSCORE)
+
+    Returns:
+        List of anomaly dicts, newest first
+    """
+    rows = execute_query(
+        """SELECT a.expense_id, e.date, a.category, e.description, a.amount, a.baseline_mean, a.zscore
+           FROM expense_anomalies a
+           JOIN expenses e ON e.expense_id = a.expense_id
+           WHERE a.user_id = %s AND a.zscore >= %s
+           ORDER BY a.expense_id DESC
+           LIMIT %s""",
+        (user_id, Config.ANOMALY_ZSCORE if min_zscore is None else min_zscore, limit),
+        fetch=True
+    )
+    return [_anomaly_from_row(row) for row in rows or []]
+
+
+def get_expense_anomaly(expense_id, user_id, min_zscore=None):
+    """
+    Check whether an expense was flagged when it was written
+
+    Args:
+        expense_id: ID of the expense
+        user_id: ID of the user (for security)
+        min_zscore: Threshold (default: Config.ANOMALY_ZSCORE)
+
+    Returns:
+        Anomaly dict, or None if the expense is not unusual
+    """
+    row = execute_query(
+        """SELECT a.expense_id, e.date, a.category, e.description, a.amount, a.baseline_mean, a.zscore
+           FROM expense_anomalies a
+           JOIN expenses e ON e.expense_id = a.expense_id
+           WHERE a.expense_id = %s AND a.user_id = %s AND a.zscore >= %s""",
+        (expense_id, user_id, Config.ANOMALY_ZSCORE if min_zscore is None else min_zscore),
+        fetch_one=True
+    )
+    return _anomaly_from_row(row) if row else None
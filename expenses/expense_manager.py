@@ -1,8 +1,12 @@
 """
 Expense management module
 """
-from database.connection import execute_query
-from datetime import datetime
+from database.connection import execute_query, execute_many, execute_write, iter_query_columns
+from currency.converter import convert_currency_batch
+from config import Config
+from datetime import datetime, timedelta
+import base64
+import json
 
 
 # Expense categories
@@ -23,6 +27,19 @@ EXPENSE_CATEGORIES = [
     'Other'
 ]
 
+# Columns of the expenses table, in schema order
+EXPENSE_COLUMNS = (
+    'expense_id',
+    'user_id',
+    'amount',
+    'base_amount',
+    'currency',
+    'category',
+    'date',
+    'description',
+    'created_at'
+)
+
 
 def add_expense(user_id, amount, category, date, description='', currency='INR', base_amount=None):
     """
@@ -43,7 +60,7 @@ def add_expense(user_id, amount, category, date, description='', currency='INR',
     if base_amount is None:
         base_amount = amount
     
-    expense_id = execute_query(
+    expense_id = execute_write(
         """INSERT INTO expenses (user_id, amount, base_amount, currency, category, date, description)
            VALUES (%s, %s, %s, %s, %s, %s, %s)""",
         (user_id, amount, base_amount, currency, category, date, description)
@@ -52,6 +69,131 @@ def add_expense(user_id, amount, category, date, description='', currency='INR',
     return expense_id
 
 
+def to_start_day(value):
+    """
+    First calendar day a start date filter includes, as 'YYYY-MM-DD'
+    
+    Expense dates are stored as 'YYYY-MM-DD' strings and have always been
+    compared against the bound parameter. A datetime binds as
+    'YYYY-MM-DD HH:MM:SS', which sorts after its own day, so a datetime
+    start excludes its calendar day; dates and day strings include it.
+    Rollup and in-memory readers use this to match the expenses query.
+    """
+    if isinstance(value, str) and len(value) > 10:
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return (value + timedelta(days=1)).strftime('%Y-%m-%d')
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def to_end_day(value):
+    """
+    Last calendar day an end date filter includes, as 'YYYY-MM-DD'
+    
+    A stored day sorts before any datetime on it, so an end bound always
+    includes its own calendar day.
+    """
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, str):
+        return value[:10]
+    return value
+
+
+def validate_expense_row(row):
+    """
+    Validate and normalize one expense record for bulk import
+    
+    Args:
+        row: Dict with amount, category, date and optional description,
+             currency and base_amount
+    
+    Returns:
+        Normalized dict
+    
+    Raises:
+        ValueError: If a field is missing or invalid
+    """
+    if not isinstance(row, dict):
+        raise ValueError('expense must be an object')
+    
+    try:
+        amount = float(row.get('amount'))
+    except (TypeError, ValueError):
+        raise ValueError('amount must be a number')
+    if amount <= 0:
+        raise ValueError('amount must be greater than 0')
+    
+    category = row.get('category')
+    if category not in EXPENSE_CATEGORIES:
+        raise ValueError(f'unknown category: {category}')
+    
+    try:
+        date = datetime.strptime(str(row.get('date')), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError('date must be in YYYY-MM-DD format')
+    
+    currency = str(row.get('currency') or 'INR').upper()
+    if len(currency) != 3 or not currency.isalpha():
+        raise ValueError(f'invalid currency: {currency}')
+    
+    base_amount = row.get('base_amount')
+    if base_amount is not None:
+        try:
+            base_amount = float(base_amount)
+        except (TypeError, ValueError):
+            raise ValueError('base_amount must be a number')
+    
+    return {
+        'amount': amount,
+        'category': category,
+        'date': date,
+        'description': str(row.get('description') or ''),
+        'currency': currency,
+        'base_amount': base_amount
+    }
+
+
+def add_expenses_bulk(user_id, rows):
+    """
+    Add many expense records in a single transaction
+    
+    Args:
+        user_id: ID of the user
+        rows: List of expense dicts (see validate_expense_row)
+    
+    Returns:
+        Number of inserted expenses, or None if the insert failed
+    
+    Raises:
+        ValueError: If any row is invalid; nothing is inserted
+    """
+    expenses = []
+    for index, row in enumerate(rows):
+        try:
+            expenses.append(validate_expense_row(row))
+        except ValueError as e:
+            raise ValueError(f'Row {index}: {e}')
+    
+    if not expenses:
+        return 0
+    
+    # Convert every row lacking a base amount with one rate lookup
+    pending = [e for e in expenses if e['base_amount'] is None]
+    converted = convert_currency_batch((e['amount'], e['currency']) for e in pending)
+    for expense, base_amount in zip(pending, converted):
+        expense['base_amount'] = base_amount
+    
+    return execute_many(
+        """INSERT INTO expenses (user_id, amount, base_amount, currency, category, date, description)
+           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        [(user_id, e['amount'], e['base_amount'], e['currency'], e['category'], e['date'], e['description'])
+         for e in expenses]
+    )
+
+
 def get_expense(expense_id, user_id):
     """
     Get a single expense by ID
@@ -71,6 +213,53 @@ def get_expense(expense_id, user_id):
     )
 
 
+def build_user_expenses_query(user_id, start_date=None, end_date=None, category=None, limit=None,
+                              columns=None, before=None):
+    """
+    Build the SQL used by get_user_expenses
+    
+    Args:
+        Same as get_user_expenses
+        columns: Optional subset of EXPENSE_COLUMNS to select (default: all)
+        before: Optional (date, expense_id) keyset; only older rows are returned
+    
+    Returns:
+        Tuple of (query, params)
+    """
+    if columns:
+        unknown = set(columns) - set(EXPENSE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown expense columns: {sorted(unknown)}")
+        query = f"SELECT {', '.join(columns)} FROM expenses WHERE user_id = %s"
+    else:
+        query = "SELECT * FROM expenses WHERE user_id = %s"
+    params = [user_id]
+    
+    if start_date:
+        query += " AND date >= %s"
+        params.append(to_start_day(start_date))
+    
+    if end_date:
+        query += " AND date <= %s"
+        params.append(to_end_day(end_date))
+    
+    if category:
+        query += " AND category = %s"
+        params.append(category)
+    
+    if before:
+        query += " AND (date, expense_id) < (%s, %s)"
+        params.extend(before)
+    
+    # expense_id breaks ties between same-day expenses so the order is stable
+    query += " ORDER BY date DESC, expense_id DESC"
+    
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    
+    return query, tuple(params)
+
+
 def get_user_expenses(user_id, start_date=None, end_date=None, category=None, limit=None):
     """
     Get all expenses for a user with optional filters
@@ -85,27 +274,142 @@ def get_user_expenses(user_id, start_date=None, end_date=None, category=None, li
     Returns:
         List of expense dicts
     """
-    query = "SELECT * FROM expenses WHERE user_id = %s"
+    query, params = build_user_expenses_query(user_id, start_date, end_date, category, limit)
+    return execute_query(query, params, fetch=True) or []
+
+
+def encode_page_cursor(expense):
+    """Encode the (date, expense_id) keyset of an expense as an opaque token"""
+    key = json.dumps([str(expense['date']), int(expense['expense_id'])])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def decode_page_cursor(token):
+    """
+    Decode a page cursor token
+    
+    Returns:
+        (date, expense_id) tuple, or None if the token is missing or invalid
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        date, expense_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return str(date), int(expense_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def get_user_expenses_page(user_id, start_date=None, end_date=None, category=None,
+                           cursor=None, page_size=None):
+    """
+    Get one page of a user's expenses, newest first, using keyset pagination
+    
+    Args:
+        user_id: ID of the user
+        start_date: Filter by start date
+        end_date: Filter by end date
+        category: Filter by category
+        cursor: Token from a previous page's next_cursor (None for the first page)
+        page_size: Number of expenses per page (clamped to EXPENSES_MAX_PAGE_SIZE)
+    
+    Returns:
+        Dict with expenses, next_cursor (None on the last page) and page_size
+    """
+    page_size = min(max(int(page_size or Config.EXPENSES_PAGE_SIZE), 1), Config.EXPENSES_MAX_PAGE_SIZE)
+    
+    # Fetch one extra row to learn whether another page exists
+    query, params = build_user_expenses_query(
+        user_id, start_date, end_date, category,
+        limit=page_size + 1, before=decode_page_cursor(cursor)
+    )
+    expenses = execute_query(query, params, fetch=True) or []
+    
+    next_cursor = None
+    if len(expenses) > page_size:
+        expenses = expenses[:page_size]
+        next_cursor = encode_page_cursor(expenses[-1])
+    
+    return {
+        'expenses': expenses,
+        'next_cursor': next_cursor,
+        'page_size': page_size
+    }
+
+
+def get_user_expenses_summary(user_id, start_date=None, end_date=None, category=None):
+    """
+    Get the count and base-currency total of a user's filtered expenses
+    
+    Read from the trigger-maintained daily rollups, so the cost grows with
+    the number of days in the range rather than the number of expenses.
+    
+    Args:
+        user_id: ID of the user
+        start_date: Filter by start date
+        end_date: Filter by end date
+        category: Filter by category
+    
+    Returns:
+        Dict with count and total
+    """
+    query = """SELECT COALESCE(SUM(count), 0) AS count, COALESCE(SUM(total), 0) AS total
+               FROM expense_daily_rollups WHERE user_id = %s"""
     params = [user_id]
     
     if start_date:
-        query += " AND date >= %s"
-        params.append(start_date)
+        query += " AND day >= %s"
+        params.append(to_start_day(start_date))
     
     if end_date:
-        query += " AND date <= %s"
-        params.append(end_date)
+        query += " AND day <= %s"
+        params.append(to_end_day(end_date))
     
     if category:
         query += " AND category = %s"
         params.append(category)
     
-    query += " ORDER BY date DESC"
+    return execute_query(query, tuple(params), fetch_one=True) or {'count': 0, 'total': 0}
+
+
+def get_user_expense_columns(user_id, start_date=None, end_date=None, category=None,
+                             columns=EXPENSE_COLUMNS):
+    """
+    Get a user's expenses in columnar form
     
-    if limit:
-        query += f" LIMIT {int(limit)}"
+    Args:
+        user_id: ID of the user
+        start_date: Filter by start date
+        end_date: Filter by end date
+        category: Filter by category
+        columns: Columns to fetch (default: all)
     
-    return execute_query(query, tuple(params), fetch=True) or []
+    Returns:
+        Dict of column name -> list of values, newest first
+    """
+    query, params = build_user_expenses_query(user_id, start_date, end_date, category, columns=columns)
+    return execute_query(query, params, fetch_columns=True) or {column: [] for column in columns}
+
+
+def iter_user_expense_chunks(user_id, start_date=None, end_date=None, category=None,
+                             columns=EXPENSE_COLUMNS, chunk_size=10000):
+    """
+    Stream a user's expenses in fixed-size columnar batches
+    
+    Args:
+        user_id: ID of the user
+        start_date: Filter by start date
+        end_date: Filter by end date
+        category: Filter by category
+        columns: Columns to fetch (default: all)
+        chunk_size: Rows per batch
+    
+    Returns:
+        Iterator of dicts of column name -> list of values, newest first
+    """
+    query, params = build_user_expenses_query(user_id, start_date, end_date, category, columns=columns)
+    return iter_query_columns(query, params, chunk_size)
 
 
 def update_expense(expense_id, user_id, amount=None, category=None, date=None, 
@@ -156,7 +460,7 @@ def update_expense(expense_id, user_id, amount=None, category=None, date=None,
     query = f"""UPDATE expenses SET {', '.join(updates)} 
                 WHERE expense_id = %s AND user_id = %s"""
     
-    result = execute_query(query, tuple(params))
+    result = execute_write(query, tuple(params))
     return result is not None
 
 
@@ -171,13 +475,34 @@ def delete_expense(expense_id, user_id):
     Returns:
         True if successful, False otherwise
     """
-    result = execute_query(
+    result = execute_write(
         "DELETE FROM expenses WHERE expense_id = %s AND user_id = %s",
         (expense_id, user_id)
     )
     return result is not None
 
 
+def get_user_data_version(user_id):
+    """
+    Get a counter that changes whenever the user's expenses change
+    
+    Maintained by triggers on the expenses table, so every write path
+    (single, bulk or batched) bumps it in the same transaction.
+    
+    Args:
+        user_id: ID of the user
+    
+    Returns:
+        Version number (0 if the user has never written an expense)
+    """
+    row = execute_query(
+        "SELECT version FROM user_data_versions WHERE user_id = %s",
+        (user_id,),
+        fetch_one=True
+    )
+    return row['version'] if row else 0
+
+
 def get_categories():
     """Return list of available expense categories"""
     return EXPENSE_CATEGORIES
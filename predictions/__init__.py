@@ -1,7 +1,21 @@
 from .prediction_engine import (
     predict_next_month_spending,
     predict_category_spending,
+    predict_all_category_spending,
     get_spending_forecast,
     analyze_spending_pattern,
-    prepare_training_data
+    prepare_training_data,
+    get_trend_model,
+    get_forecast_engine,
+    set_forecast_engine,
+    FORECAST_ENGINES,
+    model_cache
+)
+from .batch_forecast import fit_many, fit_matrix
+from .nightly import forecast_all_users
+from .smoothing import get_smoothing_state, advance_smoothing_state, smoothing_state_cache
+from .precompute import (
+    precompute_forecasts,
+    get_precomputed_forecasts,
+    start_forecast_scheduler
 )
@@ -0,0 +1,61 @@
+"""
+Prediction batch commands
+
+Usage:
+    python -m predictions forecast-all    Print every user's forecasts as JSON lines
+    python -m predictions precompute      Recompute stale rows in the predictions table
+"""
+import json
+import sys
+from database.connection import get_db_connection
+from database.migrations import run_migrations
+from predictions.nightly import forecast_all_users
+from predictions.precompute import precompute_forecasts
+
+
+def migrate():
+    connection = get_db_connection()
+    if not connection:
+        return False
+    try:
+        run_migrations(connection)
+    finally:
+        connection.close()
+    return True
+
+
+def forecast_all():
+    if not migrate():
+        return 1
+
+    for user_id, forecast in forecast_all_users().items():
+        print(json.dumps({'user_id': user_id, **forecast}))
+    return 0
+
+
+def precompute():
+    if not migrate():
+        return 1
+
+    count = precompute_forecasts()
+    if count is None:
+        return 1
+    print(f"Recomputed forecasts for {count} user(s)")
+    return 0
+
+
+COMMANDS = {
+    'forecast-all': forecast_all,
+    'precompute': precompute,
+}
+
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in COMMANDS:
+        print(__doc__.strip())
+        return 2
+    return COMMANDS[argv[0]]()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
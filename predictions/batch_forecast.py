@@ -0,0 +1,113 @@
+"""
+Closed-form batch trend forecasting
+
+Each forecast is an ordinary least-squares line through at most a handful
+of monthly points. Instead of one scikit-learn estimator per series, many
+series are stacked into a padded matrix and every slope, intercept and R²
+is solved at once with masked NumPy reductions. Results match
+prediction_engine.fit_linear_trend to floating-point tolerance.
+"""
+import numpy as np
+
+
+def stack_series(series):
+    """
+    Left-align monthly series in a zero-padded matrix
+
+    Args:
+        series: List of 1-D sequences, oldest month first
+
+    Returns:
+        Tuple of (Y, lengths): (len(series), longest) float64 matrix and
+        the number of months in each row
+    """
+    lengths = np.array([len(y) for y in series], dtype=np.int64)
+    Y = np.zeros((len(series), int(lengths.max()) if len(series) else 0))
+    for row, y in enumerate(series):
+        Y[row, :len(y)] = y
+    return Y, lengths
+
+
+def fit_linear_trends(Y, lengths):
+    """
+    Fit y = coef * month_index + intercept for every row at once
+
+    Args:
+        Y: Zero-padded matrix from stack_series
+        lengths: Months per row
+
+    Returns:
+        Dict of arrays: coef, intercept, r_squared, n and mean. Rows with
+        fewer than 2 months hold NaN.
+    """
+    x = np.arange(Y.shape[1], dtype=np.float64)
+    mask = x < lengths[:, None]
+    n = lengths.astype(np.float64)
+    valid = lengths >= 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = np.where(mask, x, 0.0).sum(axis=1) / n
+        y_mean = np.where(mask, Y, 0.0).sum(axis=1) / n
+
+        # Centered sums, as LinearRegression centers before solving
+        xc = np.where(mask, x - x_mean[:, None], 0.0)
+        yc = np.where(mask, Y - y_mean[:, None], 0.0)
+        coef = (xc * yc).sum(axis=1) / (xc * xc).sum(axis=1)
+        intercept = y_mean - coef * x_mean
+
+        residuals = np.where(mask, Y - (coef[:, None] * x + intercept[:, None]), 0.0)
+        ss_res = (residuals ** 2).sum(axis=1)
+        ss_tot = (yc ** 2).sum(axis=1)
+
+        # r2_score convention for constant series: 1.0 on a perfect fit, else 0.0
+        r_squared = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.where(ss_res == 0, 1.0, 0.0))
+
+    nan = np.full(len(lengths), np.nan)
+    return {
+        'coef': np.where(valid, coef, nan),
+        'intercept': np.where(valid, intercept, nan),
+        'r_squared': np.where(valid, r_squared, nan),
+        'n': lengths,
+        'mean': y_mean
+    }
+
+
+def fit_matrix(Y, lengths):
+    """
+    Fit a trend to each row of a left-aligned, zero-padded matrix
+
+    Args:
+        Y: Matrix of monthly series, one per row
+        lengths: Months per row
+
+    Returns:
+        List of fitted model dicts (see fit_linear_trend), None where a
+        row has fewer than 2 months
+    """
+    fits = fit_linear_trends(Y, lengths)
+    return [
+        {
+            'coef': float(fits['coef'][i]),
+            'intercept': float(fits['intercept'][i]),
+            'r_squared': float(fits['r_squared'][i]),
+            'n': int(fits['n'][i]),
+            'mean': float(fits['mean'][i])
+        } if fits['n'][i] >= 2 else None
+        for i in range(len(lengths))
+    ]
+
+
+def fit_many(series):
+    """
+    Fit a trend to each series
+
+    Args:
+        series: List of monthly series, oldest month first
+
+    Returns:
+        List of fitted model dicts, None where a series has fewer than 2
+        months
+    """
+    if not series:
+        return []
+    return fit_matrix(*stack_series(series))
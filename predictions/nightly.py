@@ -0,0 +1,75 @@
+"""
+Nightly forecasts for every user
+
+Monthly series for all users are read from the daily rollups in two
+grouped queries and fitted in one vectorized pass. Users who chose the
+Holt-Winters engine get their next-month total from their smoothing
+state instead, as they would in the app.
+"""
+from datetime import datetime, timedelta
+from config import Config
+from database.connection import execute_query
+from expenses.expense_manager import to_start_day
+from predictions.prediction_engine import next_month_prediction, category_prediction, smoothing_prediction
+from predictions.batch_forecast import fit_many
+from predictions.smoothing import get_smoothing_state
+
+
+def forecast_all_users(end_date=None):
+    """
+    Forecast next month's total and per-category spending for every user
+
+    The total uses each user's forecast engine; category forecasts are
+    always linear, as predict_all_category_spending's are.
+
+    Args:
+        end_date: Reference date (default: now)
+
+    Returns:
+        Dict of user_id -> {'next_month': prediction dict,
+        'categories': {category: prediction dict}}
+    """
+    end_date = end_date or datetime.now()
+    params = (to_start_day(end_date - timedelta(days=180)), end_date.strftime('%Y-%m-%d'))
+
+    totals = execute_query(
+        """SELECT user_id, substr(day, 1, 7) AS month, SUM(total) AS total
+           FROM expense_daily_rollups WHERE day >= %s AND day <= %s
+           GROUP BY user_id, month ORDER BY user_id, month""",
+        params, fetch_columns=True
+    )
+    by_category = execute_query(
+        """SELECT user_id, category, substr(day, 1, 7) AS month, SUM(total) AS total
+           FROM expense_daily_rollups WHERE day >= %s AND day <= %s
+           GROUP BY user_id, category, month ORDER BY user_id, category, month""",
+        params, fetch_columns=True
+    )
+    users = execute_query("SELECT user_id, forecast_engine FROM users ORDER BY user_id", fetch_columns=True)
+    if totals is None or by_category is None or users is None:
+        return {}
+
+    # get_monthly_totals rounds each month before it is used for training
+    total_series = {}
+    for user_id, total in zip(totals['user_id'], totals['total']):
+        total_series.setdefault(user_id, []).append(round(total, 2))
+
+    category_series = {}
+    for user_id, category, total in zip(by_category['user_id'], by_category['category'], by_category['total']):
+        category_series.setdefault((user_id, category), []).append(total)
+
+    total_keys = list(total_series)
+    total_models = dict(zip(total_keys, fit_many([total_series[k] for k in total_keys])))
+    category_keys = list(category_series)
+    category_models = dict(zip(category_keys, fit_many([category_series[k] for k in category_keys])))
+
+    forecasts = {}
+    for user_id, engine in zip(users['user_id'], users['forecast_engine']):
+        if (engine or Config.FORECAST_ENGINE) == 'holt_winters':
+            next_month = smoothing_prediction(get_smoothing_state(user_id, end_date.date()))
+        else:
+            next_month = next_month_prediction(total_models.get(user_id))
+        forecasts[user_id] = {'next_month': next_month, 'categories': {}}
+    for (user_id, category), model in category_models.items():
+        if user_id in forecasts:
+            forecasts[user_id]['categories'][category] = category_prediction(category_series[(user_id, category)], model)
+    return forecasts
@@ -0,0 +1,235 @@
+"""
+Precomputed forecasts
+
+A user's forecasts only change when their expenses change or when the
+trailing training window moves on with the calendar day. The scheduler
+recomputes them for users whose stored row is missing, was computed from
+an older data version or on an earlier day, and writes them to the
+predictions table. Pages read the stored row and compute inline only
+when it is stale.
+"""
+import json
+import threading
+import atexit
+from datetime import date
+from config import Config
+from database.connection import execute_query, execute_many, close_db_connection
+from analytics.context import analytics_context
+from analytics.cache import current_data_version
+from predictions.prediction_engine import (
+    predict_next_month_spending, get_spending_forecast, analyze_spending_pattern, get_forecast_engine
+)
+from predictions.smoothing import advance_smoothing_state
+from analytics.spending_cube import advance_spending_cube
+from analytics.snapshots import advance_snapshot
+
+
+def find_stale_users(limit=None):
+    """
+    List users whose precomputed forecasts are missing or out of date
+
+    Args:
+        limit: Optional maximum number of users
+
+    Returns:
+        List of user IDs, or None if the database is unavailable
+    """
+    query = """SELECT u.user_id FROM users u
+               LEFT JOIN user_data_versions v ON v.user_id = u.user_id
+               LEFT JOIN predictions p ON p.user_id = u.user_id
+               WHERE p.user_id IS NULL
+                  OR p.data_version != COALESCE(v.version, 0)
+                  OR p.computed_for != %s
+               ORDER BY u.user_id"""
+    params = (date.today().isoformat(),)
+    if limit is not None:
+        query += " LIMIT %s"
+        params += (limit,)
+
+    rows = execute_query(query, params, fetch_columns=True)
+    return None if rows is None else list(rows['user_id'])
+
+
+def compute_forecasts(user_id):
+    """
+    Compute a user's forecasts inline
+
+    The data version is read before any expenses, so a write that lands
+    mid-computation leaves the row looking stale rather than fresh.
+    The user's saved spending cube, expense snapshot (if enabled) and,
+    for Holt-Winters users, smoothing state are advanced first.
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        Dict with data_version, computed_for, next_month, forecast and pattern
+    """
+    with analytics_context(user_id):
+        version = current_data_version(user_id)
+        advance_spending_cube(user_id)
+        if Config.ANALYTICS_SNAPSHOTS_ENABLED:
+            advance_snapshot(user_id)
+        engine = get_forecast_engine(user_id)
+        if engine == 'holt_winters':
+            advance_smoothing_state(user_id)
+        next_month = predict_next_month_spending(user_id, engine)
+        return {
+            'data_version': version,
+            'computed_for': date.today().isoformat(),
+            'next_month': next_month,
+            'forecast': get_spending_forecast(user_id, 3, engine),
+            'pattern': analyze_spending_pattern(user_id, next_month)
+        }
+
+
+def store_forecasts(forecasts):
+    """
+    Write forecasts to the predictions table, replacing old rows
+
+    Args:
+        forecasts: Dict of user_id -> compute_forecasts result
+
+    Returns:
+        Number of rows written, or None if the write failed
+    """
+    return execute_many(
+        """INSERT OR REPLACE INTO predictions
+           (user_id, data_version, computed_for, next_month, forecast, pattern)
+           VALUES (%s, %s, %s, %s, %s, %s)""",
+        [(user_id, f['data_version'], f['computed_for'], json.dumps(f['next_month']),
+          json.dumps(f['forecast']), json.dumps(f['pattern']))
+         for user_id, f in forecasts.items()]
+    )
+
+
+def precompute_forecasts(limit=None):
+    """
+    Recompute and store forecasts for every user with stale rows
+
+    A user whose computation fails is logged and skipped, so the rest
+    of the batch is still stored.
+
+    Args:
+        limit: Optional maximum number of users to recompute
+
+    Returns:
+        Number of users recomputed, or None if the database is unavailable
+    """
+    user_ids = find_stale_users(limit)
+    if user_ids is None:
+        return None
+    if not user_ids:
+        return 0
+
+    forecasts = {}
+    for user_id in user_ids:
+        try:
+            forecasts[user_id] = compute_forecasts(user_id)
+        except Exception as e:
+            print(f"Error precomputing forecasts for user {user_id}: {e}")
+
+    if forecasts and store_forecasts(forecasts) is None:
+        return None
+    return len(forecasts)
+
+
+def get_precomputed_forecasts(user_id):
+    """
+    Get a user's stored forecasts if they are still current
+
+    Args:
+        user_id: User's ID
+
+    Returns:
+        Dict with next_month, forecast, pattern and computed_at, or None
+        when there is no row or it was computed from older data or on an
+        earlier day
+    """
+    row = execute_query(
+        """SELECT data_version, computed_for, next_month, forecast, pattern, computed_at
+           FROM predictions WHERE user_id = %s""",
+        (user_id,),
+        fetch_one=True
+    )
+    if not row:
+        return None
+    if row['computed_for'] != date.today().isoformat() or row['data_version'] != current_data_version(user_id):
+        return None
+
+    return {
+        'next_month': json.loads(row['next_month']),
+        'forecast': json.loads(row['forecast']),
+        'pattern': json.loads(row['pattern']),
+        'computed_at': row['computed_at']
+    }
+
+
+class ForecastScheduler:
+    """
+    In-process background recomputation of stale forecasts
+
+    Every interval seconds, up to batch_size stale users are recomputed.
+    A full batch is followed by another run after only min_pause seconds,
+    so a backlog drains without waiting for the next tick but still
+    leaves the database to request handlers between batches.
+    """
+
+    def __init__(self, interval=300, batch_size=100, min_pause=1.0):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.min_pause = min_pause
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='forecast-scheduler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the scheduler after the current run finishes"""
+        with self._lock:
+            thread = self._thread
+            self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def run_once(self):
+        """
+        Recompute one batch of stale users
+
+        Returns:
+            Number of users recomputed, or None on a database error
+        """
+        try:
+            return precompute_forecasts(self.batch_size)
+        except Exception as e:
+            print(f"Error precomputing forecasts: {e}")
+            return None
+        finally:
+            close_db_connection()
+
+    def _run(self):
+        while not self._stop.is_set():
+            count = self.run_once()
+            self._stop.wait(self.min_pause if count == self.batch_size else self.interval)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def start_forecast_scheduler():
+    """Start the process-wide ForecastScheduler, creating it on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ForecastScheduler(Config.FORECAST_SCHEDULER_INTERVAL, Config.FORECAST_SCHEDULER_BATCH_SIZE,
+                                           Config.FORECAST_SCHEDULER_MIN_PAUSE)
+            atexit.register(_scheduler.stop)
+        _scheduler.start()
+        return _scheduler
@@ -4,8 +4,65 @@ Prediction Engine using scikit-learn
 import pandas as pd
 import numpy as np
 from sklearn.linear_model import LinearRegression
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from analytics.data_analytics import get_expense_dataframe, get_monthly_totals
+from analytics.cache import AnalyticsCache, current_data_version
+from analytics.spending_cube import get_spending_cube, WEEKDAYS
+from predictions.batch_forecast import fit_matrix
+from predictions.smoothing import get_smoothing_state
+from database.connection import execute_query, execute_write
+from config import Config
+
+
+# Fitted trend models keyed by (user_id, kind, window, data version, day)
+model_cache = AnalyticsCache(Config.FORECAST_MODEL_CACHE_SIZE)
+
+# 'linear' refits a trend over the last 6 months; 'holt_winters' reads the
+# user's online smoothing state (see predictions.smoothing)
+FORECAST_ENGINES = ('linear', 'holt_winters')
+
+
+def get_forecast_engine(user_id):
+    """
+    Get the forecast engine a user has chosen
+    
+    Args:
+        user_id: User's ID
+    
+    Returns:
+        Engine name, Config.FORECAST_ENGINE if the user has not chosen one
+    """
+    row = execute_query(
+        "SELECT forecast_engine FROM users WHERE user_id = %s",
+        (user_id,),
+        fetch_one=True
+    )
+    return (row and row['forecast_engine']) or Config.FORECAST_ENGINE
+
+
+def set_forecast_engine(user_id, engine):
+    """
+    Choose the forecast engine used for a user's predictions
+    
+    Args:
+        user_id: User's ID
+        engine: One of FORECAST_ENGINES, or None for the default
+    
+    Returns:
+        True if successful, False otherwise
+    
+    Raises:
+        ValueError: If the engine is unknown
+    """
+    if engine is not None and engine not in FORECAST_ENGINES:
+        raise ValueError(f"Unknown forecast engine: {engine}")
+    
+    if execute_write("UPDATE users SET forecast_engine = %s WHERE user_id = %s", (engine, user_id)) is None:
+        return False
+    
+    # Precomputed forecasts came from the previous engine
+    execute_write("DELETE FROM predictions WHERE user_id = %s", (user_id,))
+    return True
 
 
 def prepare_training_data(user_id, months=6):
@@ -35,19 +92,99 @@ def prepare_training_data(user_id, months=6):
     return X, y
 
 
-def predict_next_month_spending(user_id):
+def fit_linear_trend(y):
     """
-    Predict next month's total spending using Linear Regression
+    Fit a linear trend of spending against month index
+    
+    Args:
+        y: Monthly amounts, oldest first
+    
+    Returns:
+        Dict with coef, intercept, r_squared, n (months) and mean
+    """
+    X = np.arange(len(y)).reshape(-1, 1)
+    
+    model = LinearRegression()
+    model.fit(X, y)
+    
+    return {
+        'coef': model.coef_[0],
+        'intercept': model.intercept_,
+        'r_squared': model.score(X, y),
+        'n': len(y),
+        'mean': np.mean(y)
+    }
+
+
+def predict_trend(model, index):
+    """Evaluate a fitted trend at a month index"""
+    return model['coef'] * index + model['intercept']
+
+
+def get_trend_model(user_id, kind, window, load_series):
+    """
+    Get a fitted trend model, reusing an earlier fit while the user's data
+    is unchanged
     
     Args:
         user_id: User's ID
+        kind: Model kind, e.g. 'total' or ('category', name)
+        window: Training window the series covers
+        load_series: Function returning the monthly series (or None)
+    
+    Returns:
+        Fitted model dict (see fit_linear_trend), or None if the series
+        has fewer than 2 months
+    """
+    def fit():
+        y = load_series()
+        if y is None or len(y) < 2:
+            return None
+        return fit_linear_trend(y)
+    
+    if not Config.ANALYTICS_CACHE_ENABLED:
+        return fit()
+    
+    # The day is part of the key because training windows trail the current date
+    key = (user_id, kind, window, current_data_version(user_id), date.today().isoformat())
+    hit, model = model_cache.get(key)
+    if not hit:
+        model = fit()
+        model_cache.put(key, model)
+    return model
+
+
+def predict_next_month_spending(user_id, engine=None):
+    """
+    Predict next month's total spending using Linear Regression, or the
+    user's Holt-Winters state if they have chosen that engine
+    
+    Args:
+        user_id: User's ID
+        engine: Forecast engine (default: the user's choice)
     
     Returns:
         Dict with prediction details
     """
-    X, y = prepare_training_data(user_id, months=6)
+    if (engine or get_forecast_engine(user_id)) == 'holt_winters':
+        return smoothing_prediction(get_smoothing_state(user_id))
+    
+    model = get_trend_model(user_id, 'total', 6, lambda: prepare_training_data(user_id, months=6)[1])
+    
+    return next_month_prediction(model)
+
+
+def next_month_prediction(model):
+    """
+    Build the next-month prediction from a fitted total spending trend
+    
+    Args:
+        model: Fitted model dict (see fit_linear_trend), or None
     
-    if X is None or len(X) < 2:
+    Returns:
+        Dict with prediction details
+    """
+    if model is None:
         return {
             'prediction': None,
             'confidence': 'low',
@@ -55,35 +192,61 @@ def predict_next_month_spending(user_id):
             'historical_average': 0
         }
     
-    # Train model
-    model = LinearRegression()
-    model.fit(X, y)
-    
     # Predict next month
-    next_month_idx = len(X)
-    prediction = model.predict([[next_month_idx]])[0]
+    next_month_idx = model['n']
+    prediction = predict_trend(model, next_month_idx)
+    
+    # R-squared for confidence
+    r_squared = model['r_squared']
     
-    # Calculate R-squared for confidence
-    r_squared = model.score(X, y)
+    # Historical average
+    historical_avg = model['mean']
     
-    # Determine confidence level
+    return {
+        'prediction': round(max(0, prediction), 2),
+        'confidence': confidence_level(r_squared),
+        'r_squared': round(r_squared, 3),
+        'historical_average': round(historical_avg, 2),
+        'trend': 'increasing' if model['coef'] > 0 else 'decreasing',
+        'monthly_change': round(model['coef'], 2)
+    }
+
+
+def confidence_level(r_squared):
+    """Map a goodness-of-fit score to 'high', 'medium' or 'low'"""
     if r_squared >= 0.7:
-        confidence = 'high'
+        return 'high'
     elif r_squared >= 0.4:
-        confidence = 'medium'
-    else:
-        confidence = 'low'
+        return 'medium'
+    return 'low'
+
+
+def smoothing_prediction(state):
+    """
+    Build the next-month prediction from a Holt-Winters state
+    
+    The state covers closed months, so next month is two steps ahead.
+    Confidence comes from how well one-step forecasts tracked each
+    month as it closed.
     
-    # Calculate historical average
-    historical_avg = np.mean(y)
+    Args:
+        state: SmoothingState, or None
+    
+    Returns:
+        Dict with prediction details (same shape as next_month_prediction)
+    """
+    if state is None or state.months < 2:
+        return next_month_prediction(None)
+    
+    r_squared = state.r_squared()
     
     return {
-        'prediction': round(max(0, prediction), 2),
-        'confidence': confidence,
+        'prediction': round(max(0, state.forecast(2)), 2),
+        'confidence': confidence_level(r_squared),
         'r_squared': round(r_squared, 3),
-        'historical_average': round(historical_avg, 2),
-        'trend': 'increasing' if model.coef_[0] > 0 else 'decreasing',
-        'monthly_change': round(model.coef_[0], 2)
+        'historical_average': round(state.mean, 2),
+        'trend': 'increasing' if state.trend > 0 else 'decreasing',
+        'monthly_change': round(state.trend, 2)
     }
 
 
@@ -116,52 +279,103 @@ def predict_category_spending(user_id, category):
     df_cat['month'] = df_cat['date'].dt.to_period('M')
     monthly = df_cat.groupby('month')['base_amount'].sum().sort_index()
     
-    if len(monthly) < 2:
+    model = get_trend_model(user_id, ('category', category), 180, lambda: monthly.values)
+    
+    return category_prediction(monthly.values, model)
+
+
+def category_prediction(y, model):
+    """
+    Build a category prediction from its monthly series and fitted trend
+    
+    Args:
+        y: Monthly category amounts, oldest first
+        model: Fitted model dict, or None if y has fewer than 2 months
+    
+    Returns:
+        Dict with category prediction
+    """
+    if model is None:
         return {
-            'prediction': round(monthly.mean(), 2),
+            'prediction': round(np.mean(y), 2),
             'confidence': 'low',
             'message': 'Limited data, using average'
         }
     
-    # Train model
-    X = np.array(range(len(monthly))).reshape(-1, 1)
-    y = monthly.values
+    prediction = predict_trend(model, model['n'])
     
-    model = LinearRegression()
-    model.fit(X, y)
+    return {
+        'prediction': round(max(0, prediction), 2),
+        'historical_average': round(model['mean'], 2),
+        'confidence': 'medium' if model['r_squared'] >= 0.4 else 'low'
+    }
+
+
+def predict_all_category_spending(user_id):
+    """
+    Predict spending for every category from one fetch
+    
+    The six months of expenses are pivoted into a month x category
+    matrix and every category's trend is fitted at once.
+    
+    Args:
+        user_id: User's ID
+    
+    Returns:
+        Dict of category -> prediction dict (as predict_category_spending),
+        for each category with data
+    """
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=180)  # 6 months
     
-    prediction = model.predict([[len(X)]])[0]
+    df = get_expense_dataframe(user_id, start_date, end_date)
+    
+    if df.empty:
+        return {}
+    
+    matrix = df.assign(month=df['date'].dt.to_period('M')).pivot_table(
+        index='month', columns='category', values='base_amount', aggfunc='sum', observed=True
+    ).sort_index()
+    
+    # One row per category, its months with spending packed to the left
+    values = matrix.to_numpy(dtype=np.float64).T
+    present = ~np.isnan(values)
+    order = np.argsort(~present, axis=1, kind='stable')
+    Y = np.take_along_axis(np.where(present, values, 0.0), order, axis=1)
+    lengths = present.sum(axis=1)
     
     return {
-        'prediction': round(max(0, prediction), 2),
-        'historical_average': round(np.mean(y), 2),
-        'confidence': 'medium' if model.score(X, y) >= 0.4 else 'low'
+        str(category): category_prediction(Y[i, :lengths[i]], model)
+        for i, (category, model) in enumerate(zip(matrix.columns, fit_matrix(Y, lengths)))
     }
 
 
-def get_spending_forecast(user_id, months_ahead=3):
+def get_spending_forecast(user_id, months_ahead=3, engine=None):
     """
     Get spending forecast for multiple months
     
     Args:
         user_id: User's ID
         months_ahead: Number of months to forecast
+        engine: Forecast engine (default: the user's choice)
     
     Returns:
         List of monthly predictions
     """
-    X, y = prepare_training_data(user_id, months=6)
-    
-    if X is None or len(X) < 2:
-        return []
-    
-    model = LinearRegression()
-    model.fit(X, y)
+    if (engine or get_forecast_engine(user_id)) == 'holt_winters':
+        state = get_smoothing_state(user_id)
+        if state is None or state.months < 2:
+            return []
+        predict = lambda i: state.forecast(i + 2)
+    else:
+        model = get_trend_model(user_id, 'total', 6, lambda: prepare_training_data(user_id, months=6)[1])
+        if model is None:
+            return []
+        predict = lambda i: predict_trend(model, model['n'] + i)
     
     forecasts = []
     for i in range(months_ahead):
-        future_idx = len(X) + i
-        prediction = model.predict([[future_idx]])[0]
+        prediction = predict(i)
         
         # Calculate month name
         future_date = datetime.now() + timedelta(days=30 * (i + 1))
@@ -175,22 +389,28 @@ def get_spending_forecast(user_id, months_ahead=3):
     return forecasts
 
 
-def analyze_spending_pattern(user_id):
+def analyze_spending_pattern(user_id, prediction=None):
     """
     Analyze user's spending pattern
     
+    Insights come from slices of the user's month x weekday x category
+    spending cube over the current month and the two before it.
+    
     Args:
         user_id: User's ID
+        prediction: predict_next_month_spending result, if the caller
+                    already has it
     
     Returns:
         Dict with pattern analysis
     """
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=90)
+    cube = get_spending_cube(user_id)
+    end_month = np.datetime64(datetime.now(), 'M')
     
-    df = get_expense_dataframe(user_id, start_date, end_date)
+    if cube is not None:
+        sums, counts = cube.window(str(end_month - 2), str(end_month))
     
-    if df.empty:
+    if cube is None or counts.sum() == 0:
         return {
             'pattern': 'unknown',
             'insights': ['Not enough data to analyze patterns']
@@ -199,22 +419,20 @@ def analyze_spending_pattern(user_id):
     insights = []
     
     # Analyze day of week pattern
-    df['day_of_week'] = df['date'].dt.day_name()
-    dow_spending = df.groupby('day_of_week')['base_amount'].sum()
-    
-    if not dow_spending.empty:
-        peak_day = dow_spending.idxmax()
-        insights.append(f"You spend most on {peak_day}s")
+    weekday_totals = np.where(counts.sum(axis=1) > 0, sums.sum(axis=1), -np.inf)
+    peak_day = WEEKDAYS[int(np.argmax(weekday_totals))]
+    insights.append(f"You spend most on {peak_day}s")
     
     # Analyze category pattern
-    category_spending = df.groupby('category')['base_amount'].sum().sort_values(ascending=False)
-    if not category_spending.empty:
-        top_category = category_spending.index[0]
-        top_percentage = (category_spending.iloc[0] / category_spending.sum()) * 100
-        insights.append(f"{top_category} accounts for {round(top_percentage, 1)}% of your spending")
+    category_totals = sums.sum(axis=0)
+    present = np.flatnonzero(counts.sum(axis=0) > 0)
+    ranked = present[np.argsort(-category_totals[present], kind='stable')]
+    top_category = cube.categories[ranked[0]]
+    top_percentage = float(category_totals[ranked[0]] / category_totals[present].sum()) * 100
+    insights.append(f"{top_category} accounts for {round(top_percentage, 1)}% of your spending")
     
     # Analyze trend
-    prediction_data = predict_next_month_spending(user_id)
+    prediction_data = prediction or predict_next_month_spending(user_id)
     if prediction_data['prediction']:
         if prediction_data['trend'] == 'increasing':
             insights.append(f"Your spending is trending upward by ₹{abs(prediction_data['monthly_change'])}/month")
@@ -224,6 +442,6 @@ def analyze_spending_pattern(user_id):
     return {
         'pattern': prediction_data.get('trend', 'stable'),
         'insights': insights,
-        'top_categories': dict(category_spending.head(3)),
-        'peak_spending_day': peak_day if not dow_spending.empty else 'Unknown'
+        'top_categories': {cube.categories[i]: round(float(category_totals[i]), 2) for i in ranked[:3]},
+        'peak_spending_day': peak_day
     }
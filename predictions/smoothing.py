@@ -0,0 +1,271 @@
+"""
+Online Holt-Winters forecasting of monthly spending
+
+Each user's level, trend and 12 calendar-month seasonal components are
+kept in the forecast_states table and advanced by one O(1) update per
+closed month, instead of refitting over a window of monthly totals on
+every request.
+
+The state covers closed months only (those before the current one), so
+expenses dated in the open month never touch it. A state is refreshed
+by reading the delta log since it was saved: if nothing changed in a
+month it already covers, only newly closed months are applied; a change
+to an earlier month, or a log pruned past the state, rebuilds it from
+the monthly rollups.
+
+Requests refresh a copy kept in a per-process cache, so between saves
+each read costs only the changes since the last one. The saved state is
+advanced by the forecast precompute job (see predictions.precompute),
+so reads never write.
+"""
+import json
+from datetime import date
+from config import Config
+from database.connection import execute_query, execute_write
+from analytics.cache import AnalyticsCache, current_data_version
+
+
+STATE_COLUMNS = ['month', 'months', 'level', 'trend', 'seasonal', 'mean',
+                 'scored', 'score_mean', 'score_m2', 'sse', 'seq', 'version']
+
+smoothing_state_cache = AnalyticsCache(Config.SMOOTHING_STATE_CACHE_SIZE)
+
+
+def next_month_key(month):
+    """'YYYY-MM' of the month after the given one"""
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+
+def last_closed_month(today=None):
+    """'YYYY-MM' of the month before today's"""
+    today = today or date.today()
+    if today.month == 1:
+        return f"{today.year - 1:04d}-12"
+    return f"{today.year:04d}-{today.month - 1:02d}"
+
+
+class SmoothingState:
+    """Additive Holt-Winters state for one user's monthly totals"""
+
+    def __init__(self, month=None, months=0, level=0.0, trend=0.0, seasonal=None, mean=0.0,
+                 scored=0, score_mean=0.0, score_m2=0.0, sse=0.0, seq=0, version=0):
+        self.month = month              # Last month applied ('YYYY-MM'), None before any
+        self.months = months            # Months applied, including empty ones
+        self.level = level
+        self.trend = trend
+        self.seasonal = seasonal or [0.0] * 12  # Indexed by calendar month - 1
+        self.mean = mean                # Mean of every applied month
+        self.scored = scored            # Months with a one-step-ahead forecast...
+        self.score_mean = score_mean    # ...their mean and sum of squared deviations,
+        self.score_m2 = score_m2
+        self.sse = sse                  # ...and the squared forecast errors
+        self.seq = seq                  # Last delta log entry reflected in the state
+        self.version = version          # User data version at that point
+
+    def forecast(self, steps):
+        """Forecast the month the given number of steps after self.month"""
+        index = (int(self.month[5:7]) - 1 + steps) % 12
+        return self.level + steps * self.trend + self.seasonal[index]
+
+    def update(self, month, total):
+        """
+        Apply one closed month's total
+
+        Args:
+            month: 'YYYY-MM' following self.month
+            total: Spending in that month
+        """
+        alpha, beta, gamma = Config.FORECAST_SMOOTHING_ALPHA, Config.FORECAST_SMOOTHING_BETA, Config.FORECAST_SMOOTHING_GAMMA
+        index = int(month[5:7]) - 1
+
+        if self.months == 0:
+            # Start flat: the first month is often partial
+            self.level = total
+        else:
+            error = total - self.forecast(1)
+            self.scored += 1
+            delta = total - self.score_mean
+            self.score_mean += delta / self.scored
+            self.score_m2 += delta * (total - self.score_mean)
+            self.sse += error * error
+
+            level = alpha * (total - self.seasonal[index]) + (1 - alpha) * (self.level + self.trend)
+            self.trend = beta * (level - self.level) + (1 - beta) * self.trend
+            self.seasonal[index] = gamma * (total - level) + (1 - gamma) * self.seasonal[index]
+            self.level = level
+
+        self.months += 1
+        self.mean += (total - self.mean) / self.months
+        self.month = month
+
+    def r_squared(self):
+        """Share of month-to-month variance explained by one-step forecasts"""
+        if self.scored < 2 or self.score_m2 <= 0:
+            return 0.0
+        return max(0.0, 1 - self.sse / self.score_m2)
+
+    def to_row(self):
+        return [json.dumps(self.seasonal) if column == 'seasonal' else getattr(self, column)
+                for column in STATE_COLUMNS]
+
+    @classmethod
+    def from_row(cls, row):
+        values = {column: row[column] for column in STATE_COLUMNS}
+        values['seasonal'] = json.loads(values['seasonal'])
+        return cls(**values)
+
+    def copy(self):
+        return SmoothingState.from_row(dict(zip(STATE_COLUMNS, self.to_row())))
+
+
+def _apply_months(state, rows, through_month):
+    """Apply monthly totals in order, filling months without rows with 0"""
+    totals = {row['month']: row['total'] for row in rows}
+    month = next_month_key(state.month) if state.month else min(totals, default=None)
+    while month is not None and month <= through_month:
+        state.update(month, totals.get(month, 0.0))
+        month = next_month_key(month)
+
+
+def build_smoothing_state(user_id, through_month):
+    """
+    Build a user's state from the monthly rollups
+
+    The delta log position and data version are read in the same
+    statement as the rollups, so they describe the same snapshot.
+    """
+    rows = execute_query(
+        """SELECT NULL AS month, 0 AS total,
+                  (SELECT COALESCE(MAX(seq), 0) FROM expense_daily_deltas) AS seq,
+                  (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version
+           UNION ALL
+           SELECT month, SUM(total), NULL, NULL FROM expense_monthly_rollups
+           WHERE user_id = %s AND month <= %s GROUP BY month""",
+        (user_id, user_id, through_month),
+        fetch=True
+    )
+    if rows is None:
+        return None
+
+    header = next(row for row in rows if row['month'] is None)
+    state = SmoothingState(seq=header['seq'], version=header['version'])
+    _apply_months(state, [row for row in rows if row['month'] is not None], through_month)
+    return state
+
+
+def refresh_smoothing_state(user_id, state, through_month):
+    """
+    Bring a saved state up to date
+
+    Returns:
+        Tuple of (state, changed)
+    """
+    changed = False
+
+    if state.version != current_data_version(user_id):
+        rows = execute_query(
+            """SELECT w.pruned_through,
+                      (SELECT COALESCE(MAX(version), 0) FROM user_data_versions WHERE user_id = %s) AS version,
+                      d.seq, d.day
+               FROM expense_delta_watermark w
+               LEFT JOIN expense_daily_deltas d ON d.user_id = %s AND d.seq > %s
+               ORDER BY d.seq""",
+            (user_id, user_id, state.seq),
+            fetch=True
+        )
+        if not rows or rows[0]['pruned_through'] > state.seq:
+            return build_smoothing_state(user_id, through_month), True
+
+        deltas = [row for row in rows if row['seq'] is not None]
+        if state.month and any(row['day'][:7] <= state.month for row in deltas):
+            return build_smoothing_state(user_id, through_month), True
+
+        # Only open or not yet applied months changed
+        state.seq = deltas[-1]['seq'] if deltas else state.seq
+        state.version = rows[0]['version']
+        changed = True
+
+    if state.month is None or state.month < through_month:
+        rows = execute_query(
+            """SELECT month, SUM(total) AS total FROM expense_monthly_rollups
+               WHERE user_id = %s AND month > %s AND month <= %s GROUP BY month""",
+            (user_id, state.month or '', through_month),
+            fetch=True
+        )
+        if rows is None:
+            return None, False
+        month = state.month
+        _apply_months(state, rows, through_month)
+        changed = changed or state.month != month
+
+    return state, changed
+
+
+def save_smoothing_state(user_id, state):
+    """Persist a user's state, replacing the previous one"""
+    placeholders = ', '.join(['%s'] * (len(STATE_COLUMNS) + 1))
+    return execute_write(
+        f"INSERT OR REPLACE INTO forecast_states (user_id, {', '.join(STATE_COLUMNS)}) VALUES ({placeholders})",
+        (user_id, *state.to_row())
+    )
+
+
+def get_smoothing_state(user_id, today=None):
+    """
+    Get a user's up-to-date Holt-Winters state without saving it
+
+    Looks in the process cache, then the forecast_states table, and
+    caches the state in this process once it is brought up to date.
+
+    Args:
+        user_id: User's ID
+        today: Reference date (default: today)
+
+    Returns:
+        SmoothingState covering every month before today's, or None if
+        the database is unavailable
+    """
+    through_month = last_closed_month(today)
+    hit, state = smoothing_state_cache.get(user_id)
+
+    if not hit:
+        row = execute_query(
+            f"SELECT {', '.join(STATE_COLUMNS)} FROM forecast_states WHERE user_id = %s",
+            (user_id,),
+            fetch_one=True
+        )
+        state = SmoothingState.from_row(row) if row else None
+
+    if state is None:
+        state, changed = build_smoothing_state(user_id, through_month), True
+    else:
+        # Refreshing updates in place; cached states are shared between requests
+        state, changed = refresh_smoothing_state(user_id, state.copy() if hit else state, through_month)
+
+    if state is not None and (changed or not hit):
+        smoothing_state_cache.put(user_id, state)
+    return state
+
+
+def advance_smoothing_state(user_id, today=None):
+    """
+    Bring a user's saved Holt-Winters state up to date
+
+    Args:
+        user_id: User's ID
+        today: Reference date (default: today)
+
+    Returns:
+        The saved SmoothingState, or None if the database is unavailable
+    """
+    saved = execute_query(
+        "SELECT month, seq, version FROM forecast_states WHERE user_id = %s",
+        (user_id,),
+        fetch_one=True
+    )
+    state = get_smoothing_state(user_id, today)
+    if state is not None and (not saved or (saved['month'], saved['seq'], saved['version']) !=
+                              (state.month, state.seq, state.version)):
+        save_smoothing_state(user_id, state)
+    return state
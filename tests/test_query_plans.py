@@ -0,0 +1,47 @@
+"""
+Query plan regression tests
+
+Runs the same EXPLAIN QUERY PLAN checks as `python -m database check`
+against a freshly migrated database, so an index or query change that
+brings back a full scan or a temporary sort fails the test suite.
+
+Usage:
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from config import Config
+from database.connection import get_db_connection
+from database.migrations import run_migrations, check_query_plans
+
+
+class QueryPlanTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with mock.patch.object(Config, 'DATABASE_PATH', os.path.join(self.directory, 'plans.db')):
+            self.connection = get_db_connection()
+        run_migrations(self.connection)
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_hot_queries_use_indexes(self):
+        self.assertEqual(check_query_plans(self.connection), [])
+
+    def test_missing_index_is_reported(self):
+        indexes = [row['name'] for row in self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'expenses' AND sql IS NOT NULL"
+        )]
+        for name in indexes:
+            self.connection.execute(f"DROP INDEX {name}")
+
+        self.assertNotEqual(check_query_plans(self.connection), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -152,18 +152,20 @@ def create_daily_trend_chart(user_id, days=30):
     return fig_to_base64(fig)
 
 
-def create_prediction_comparison_chart(user_id):
+def create_prediction_comparison_chart(user_id, prediction=None):
     """
     Create chart comparing predictions with actual spending
     
     Args:
         user_id: User's ID
+        prediction: predict_next_month_spending result, if the caller
+                    already has one (e.g. precomputed)
     
     Returns:
         Base64 encoded PNG image
     """
     monthly_data = get_monthly_totals(user_id, 6)
-    prediction = predict_next_month_spending(user_id)
+    prediction = prediction or predict_next_month_spending(user_id)
     
     if not monthly_data:
         return create_empty_chart("No data for prediction comparison")